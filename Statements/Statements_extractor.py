@@ -32,6 +32,10 @@ from statistics import median
 from datetime import datetime, date, timedelta
 
 import pdfplumber
+try:
+    import fitz  # PyMuPDF — much faster C-backed text extraction
+except Exception:
+    fitz = None
 from pdf2image import convert_from_path, convert_from_bytes
 import pytesseract
 from dateutil import parser as dateparser
@@ -183,7 +187,28 @@ def _normalize_desc(desc: str) -> str:
     return " ".join(s.split())
 
 # ---------------- Read PDF text ----------------
+def _fitz_text(pdf_bytes: Optional[bytes] = None, path: Optional[str] = None) -> Optional[str]:
+    """Native text via PyMuPDF; returns None when unavailable/empty."""
+    if fitz is None:
+        return None
+    try:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf") if pdf_bytes is not None else fitz.open(path)
+        try:
+            blocks = []
+            for p in doc:
+                t = p.get_text("text") or ""
+                if t.strip(): blocks.append(t)
+            return "\n".join(blocks).strip()
+        finally:
+            doc.close()
+    except Exception:
+        return None
+
 def read_pdf_text(path: str) -> Tuple[str, bool]:
+    # Fast path: PyMuPDF
+    full = _fitz_text(path=path)
+    if full and len(full) >= 300:
+        return full, False
     # Try native text
     try:
         blocks = []
@@ -206,6 +231,10 @@ def read_pdf_text(path: str) -> Tuple[str, bool]:
     return "\n".join(txts), True
 
 def read_pdf_text_from_bytes(pdf_bytes: bytes) -> Tuple[str, bool]:
+    # Fast path: PyMuPDF straight from the in-memory bytes
+    full = _fitz_text(pdf_bytes=pdf_bytes)
+    if full and len(full) >= 300:
+        return full, False
     # Native text first
     try:
         blocks = []
@@ -26,6 +26,7 @@ Returns:
 """
 
 from __future__ import annotations
+import re
 from typing import Dict, Any, List, Optional, Tuple
 
 # ---------------------------
@@ -603,24 +604,15 @@ def _to_float(x) -> Optional[float]:
 def _norm_industry_text(s: Optional[str]) -> str:
     return (s or "").strip().lower()
 
-def _ind_match(industry_text: str, needle: str) -> bool:
-    """
-    Case-insensitive substring match with a few normalizations so
-    'auto sales', 'autosales', 'auto/rv/boat sales' all stand a chance.
-    """
-    hay = industry_text.replace("/", " ").replace("-", " ").replace("&", " ")
-    hay = " ".join(hay.split())
-    ndl = needle.strip().lower().replace("/", " ").replace("-", " ")
-    ndl = " ".join(ndl.split())
-    return ndl in hay
+def _norm_needle(s: str) -> str:
+    """Normalize an industry needle so 'auto sales', 'autosales' and
+    'auto/rv/boat sales' all stand a chance against the same haystack."""
+    ndl = s.strip().lower().replace("/", " ").replace("-", " ")
+    return " ".join(ndl.split())
 
-def _positions_ok(accepted: Optional[List[int]], positions: Optional[int]) -> Tuple[bool, str]:
-    if not accepted:
-        return (True, "OK")
-    if positions is None:
-        # if unknown, don't auto-fail—treat as soft-miss
-        return (True, "OK")
-    return (positions in set(accepted), f"Positions {positions} not in {accepted}")
+def _norm_hay(industry_text: str) -> str:
+    hay = industry_text.replace("/", " ").replace("-", " ").replace("&", " ")
+    return " ".join(hay.split())
 
 def _min_gate(name: str, actual: Optional[float], threshold: Optional[float]) -> Tuple[bool, str]:
     if threshold is None:
@@ -636,81 +628,93 @@ def _max_gate(name: str, actual: Optional[float], threshold: Optional[float]) ->
         return (False, f"{name} missing")
     return (actual <= threshold, f"{name} > {threshold:g}")
 
-def _declines_by_industry(restricted: List[str], ind_text: str) -> Optional[str]:
-    for r in restricted or []:
-        if _ind_match(ind_text, r):
-            return f"Restricted industry: {r}"
-    return None
-
-def _conditional_decline(rules: List[Dict[str, Any]], ind_text: str, avg_rev: Optional[float]) -> Optional[str]:
-    if not rules:
-        return None
-    for rule in rules:
-        needle = str(rule.get("industry") or "").strip()
-        limit = _to_float(rule.get("revenueLT"))
-        if needle and limit is not None and _ind_match(ind_text, needle):
-            if (avg_rev or 0.0) < limit:
-                return f"Revenue < {limit:g} for industry '{needle}'"
-    return None
-
-def _bonus_preferred(preferred: List[str], ind_text: str) -> float:
-    for p in preferred or []:
-        if _ind_match(ind_text, p):
-            return 0.05
-    return 0.0
+def _prepare_rule(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """Coerce a raw LENDERS entry into lookup-ready form once at import:
+    sets for membership tests, numeric thresholds already converted, and
+    industry needles pre-normalized (the normalization used to run per
+    needle per lender per request)."""
+    accepted = rule.get("positionsAccepted") or []
+    return {
+        "restricted_states": frozenset(rule.get("restrictedStates") or []),
+        "positions": frozenset(accepted) if accepted else None,
+        "min_fico": _to_int(rule.get("minFICO")),
+        "min_rev": _to_float(rule.get("minRevenueMonthly")),
+        "min_tib": _to_float(rule.get("minTIB")),
+        "min_dep": _to_float(rule.get("minDepositsPerMonth")),
+        "min_adb": _to_float(rule.get("minADB")),
+        "max_negd": _to_float(rule.get("maxNegativeDaysPerMonth")),
+        "restricted_industries": [(_norm_needle(r), r) for r in (rule.get("restrictedIndustries") or []) if r],
+        "cond_rules": [
+            (_norm_needle(str(c.get("industry") or "")), str(c.get("industry") or "").strip(), _to_float(c.get("revenueLT")))
+            for c in (rule.get("conditionalDeclineRules") or [])
+        ],
+        "preferred": [_norm_needle(p) for p in (rule.get("preferredIndustries") or []) if p],
+    }
 
-def _evaluate_one(name: str, rule: Dict[str, Any], app: Dict[str, Any], bank: Dict[str, Any]) -> Tuple[bool, float, str]:
-    reasons: List[str] = []
+_PREPARED_LENDERS: List[Tuple[str, Dict[str, Any]]] = [
+    (name, _prepare_rule(rule)) for name, rule in LENDERS.items()
+]
 
-    state = _norm_state(app.get("state"))
-    fico  = _to_int(app.get("fico"))
+def _extract_features(app: Dict[str, Any], bank: Dict[str, Any]) -> Dict[str, Any]:
+    """Coerce the app/bank inputs once per request instead of once per lender."""
     tib_m = _to_float(app.get("length_months"))
     if tib_m is None:
         tib_m = _coerce_length_months_from_string(app.get("length_of_ownership") or app.get("LengthOfOwnership") or "")
-    ind   = _norm_industry_text(app.get("industry"))
-
-    avg_rev = _to_float(bank.get("avg_revenue"))
-    adb     = _to_float(bank.get("avg_daily_balance"))
-    negd    = _to_int(bank.get("neg_days"))
-    depf    = _to_float(bank.get("deposit_freq"))
-    pos     = _to_int(bank.get("positions"))
+    return {
+        "state": _norm_state(app.get("state")),
+        "fico": _to_int(app.get("fico")),
+        "tib_m": tib_m,
+        "ind_hay": _norm_hay(_norm_industry_text(app.get("industry"))),
+        "avg_rev": _to_float(bank.get("avg_revenue")),
+        "adb": _to_float(bank.get("avg_daily_balance")),
+        "negd": _to_int(bank.get("neg_days")),
+        "depf": _to_float(bank.get("deposit_freq")),
+        "pos": _to_int(bank.get("positions")),
+    }
 
+def _evaluate_one(name: str, prep: Dict[str, Any], f: Dict[str, Any]) -> Tuple[bool, float, str]:
     # state restrictions
-    rst = rule.get("restrictedStates") or []
-    if state and state in set(rst):
+    state = f["state"]
+    if state and state in prep["restricted_states"]:
         return (False, 0.0, f"State restricted: {state}")
 
     # industry hard blocks
-    ri = rule.get("restrictedIndustries") or []
-    msg = _declines_by_industry(ri, ind)
-    if msg:
-        return (False, 0.0, msg)
+    hay = f["ind_hay"]
+    for ndl, orig in prep["restricted_industries"]:
+        if ndl in hay:
+            return (False, 0.0, f"Restricted industry: {orig}")
 
-    # positions
-    ok, why = _positions_ok(rule.get("positionsAccepted"), pos)
-    if not ok:
-        return (False, 0.0, why)
+    # positions (unknown positions are a soft-miss, not an auto-fail)
+    pos = f["pos"]
+    accepted = prep["positions"]
+    if accepted is not None and pos is not None and pos not in accepted:
+        return (False, 0.0, f"Positions {pos} not in {sorted(accepted)}")
 
     # numeric gates
     gates = [
-        _min_gate("FICO", fico, _to_int(rule.get("minFICO"))),
-        _min_gate("Monthly revenue", avg_rev, _to_float(rule.get("minRevenueMonthly"))),
-        _min_gate("TIB months", tib_m, _to_float(rule.get("minTIB"))),
-        _min_gate("Deposits/mo", depf, _to_float(rule.get("minDepositsPerMonth"))),
-        _min_gate("ADB", adb, _to_float(rule.get("minADB"))),
-        _max_gate("Negative days/mo", negd, _to_float(rule.get("maxNegativeDaysPerMonth"))),
+        _min_gate("FICO", f["fico"], prep["min_fico"]),
+        _min_gate("Monthly revenue", f["avg_rev"], prep["min_rev"]),
+        _min_gate("TIB months", f["tib_m"], prep["min_tib"]),
+        _min_gate("Deposits/mo", f["depf"], prep["min_dep"]),
+        _min_gate("ADB", f["adb"], prep["min_adb"]),
+        _max_gate("Negative days/mo", f["negd"], prep["max_negd"]),
     ]
     for ok, why in gates:
         if not ok:
             return (False, 0.0, why)
 
     # conditional declines (industry×revenue)
-    cd_msg = _conditional_decline(rule.get("conditionalDeclineRules") or [], ind, avg_rev)
-    if cd_msg:
-        return (False, 0.0, cd_msg)
+    avg_rev = f["avg_rev"]
+    for ndl, orig, limit in prep["cond_rules"]:
+        if ndl and limit is not None and ndl in hay and (avg_rev or 0.0) < limit:
+            return (False, 0.0, f"Revenue < {limit:g} for industry '{orig}'")
 
     # eligible → score
-    score = 1.0 + _bonus_preferred(rule.get("preferredIndustries") or [], ind)
+    score = 1.0
+    for ndl in prep["preferred"]:
+        if ndl in hay:
+            score += 0.05
+            break
     return (True, score, "OK")
 
 # ---------------------------
@@ -745,9 +749,10 @@ def select_lenders(app: Dict[str, Any], bank: Dict[str, Any], statements_count:
     Core matcher. Returns a list of dicts shaped for your UI:
       [{"business_name": <LenderName>, "score": 1.0, "reason": "OK"}, ...]
     """
+    feats = _extract_features(app, bank)
     out: List[Dict[str, Any]] = []
-    for name, rule in LENDERS.items():
-        ok, score, reason = _evaluate_one(name, rule, app, bank)
+    for name, prep in _PREPARED_LENDERS:
+        ok, score, reason = _evaluate_one(name, prep, feats)
         out.append({"business_name": name, "score": float(score if ok else 0.0), "reason": reason})
 
     # Sort: eligible (score>0) first, by score desc, then name
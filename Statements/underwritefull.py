@@ -3,8 +3,7 @@
 
 from __future__ import annotations
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-from dataclasses import asdict
+from typing import Callable, Dict, List, Tuple, Optional, Union
 from inspect import signature
 from flask import Blueprint, jsonify, request, session
 from werkzeug.utils import secure_filename
@@ -13,7 +12,11 @@ from flask import session, send_file, Response
 from pathlib import Path
 import csv, io, re, time
 import base64
+import functools
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import email
+import email.generator
 import email.policy
 import email.utils
 import email.mime.multipart
@@ -21,6 +24,8 @@ import email.mime.text
 import email.mime.base
 import mimetypes
 import json
+import operator
+import pickle
 import logging
 import os
 import re
@@ -60,6 +65,11 @@ bp = Blueprint("underwrite", __name__)
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("underwrite")
 
+# Shared keep-alive session so bulk sends reuse TLS connections to
+# Gmail/Graph instead of handshaking per request.
+_HTTP = requests.Session()
+_HTTP.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16))
+
 
 try:
     import Application_extractor as appx
@@ -79,6 +89,40 @@ except Exception as e:
     rules = None
     log.exception("Failed to import lenders_rules: %s", e)
 
+try:
+    import pandas as pd
+except Exception:
+    pd = None
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import numba
+except Exception:
+    numba = None
+
+if numba is not None and np is not None:
+    @numba.njit(cache=True)
+    def _scatter_add(out, ids, amts):  # pragma: no cover - compiled
+        for i in range(ids.shape[0]):
+            out[ids[i]] += amts[i]
+else:
+    _scatter_add = None
+
+def _json_loads(s):
+    """Parse JSON with orjson when installed (3-5x faster), stdlib otherwise."""
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
 
 def _unique_name(base: str) -> str:
     return f"{int(time.time())}_{secrets.token_hex(3)}_{secure_filename(base)}"
@@ -149,35 +193,92 @@ def _summarize_one_statement_from_bytes(pdf_bytes: bytes, filename: Optional[str
     if stx is None:
         raise RuntimeError("Statements_extractor not available")
     summary, daily, txns = stx.summarize_statement_from_bytes(pdf_bytes, filename=filename)
-    summary_dict = asdict(summary) if hasattr(summary, "__dataclass_fields__") else dict(summary)
+    # One shallow level is all we flatten; asdict() would deep-copy every
+    # nested list/dict in the summary.
+    summary_dict = {**summary.__dict__} if hasattr(summary, "__dict__") else dict(summary)
     debit_counts, credit_counts, monthly_deposits = stx.compute_monthly_counts_and_deposits(txns)  
-    summary_dict["_monthly_deposits"] = monthly_deposits
+    summary_dict["_monthly_deposits"] = {ym: float(a) for ym, a in (monthly_deposits or {}).items()}
     summary_dict["_debit_counts"] = debit_counts
     summary_dict["_credit_counts"] = credit_counts
     summary_dict["source_file"] = filename
+    # Coerce the aggregated scalars once at the source so the aggregator can
+    # do straight arithmetic instead of guarding every conversion.
+    summary_dict["negative_ending_days"] = int(summary_dict.get("negative_ending_days") or 0)
+    summary_dict["debit_count"] = int(summary_dict.get("debit_count") or 0)
+    summary_dict["credit_count"] = int(summary_dict.get("credit_count") or 0)
+    adb = summary_dict.get("average_daily_balance")
+    summary_dict["average_daily_balance"] = float(adb) if adb is not None else None
     return summary_dict
 
+_YM_RE = re.compile(r"^(\d{4})-(\d{2})$")
+
+def _rollup_monthly_deposits(per_statement: List[Dict]) -> Dict[str, float]:
+    """Sum every statement's _monthly_deposits into one {YYYY-MM: total}.
+
+    When numba+numpy are installed, months are encoded as year*12+month
+    and summed with a jitted scatter-add; otherwise (or for malformed
+    keys) the plain dict reducer runs.
+    """
+    if _scatter_add is not None:
+        ids: List[int] = []
+        amts: List[float] = []
+        encodable = True
+        for s in per_statement:
+            for ym, amt in (s.get("_monthly_deposits") or {}).items():
+                m = _YM_RE.match(ym or "")
+                if not m:
+                    encodable = False
+                    break
+                ids.append(int(m.group(1)) * 12 + int(m.group(2)) - 1)
+                amts.append(amt)
+            if not encodable:
+                break
+        if encodable:
+            if not ids:
+                return {}
+            id_arr = np.asarray(ids, dtype=np.int64)
+            lo = int(id_arr.min())
+            out = np.zeros(int(id_arr.max()) - lo + 1, dtype=np.float64)
+            _scatter_add(out, id_arr - lo, np.asarray(amts, dtype=np.float64))
+            return {f"{i // 12:04d}-{i % 12 + 1:02d}": float(out[i - lo])
+                    for i in np.unique(id_arr)}
+
+    totals: Dict[str, float] = {}
+    for s in per_statement:
+        for ym, amt in (s.get("_monthly_deposits") or {}).items():
+            totals[ym] = totals.get(ym, 0.0) + amt
+    return totals
+
+_AGG_DEFAULTS = {
+    "_monthly_deposits": None,
+    "negative_ending_days": 0,
+    "average_daily_balance": None,
+    "debit_count": 0,
+    "credit_count": 0,
+}
+_AGG_FIELDS = operator.itemgetter("_monthly_deposits", "negative_ending_days",
+                                  "average_daily_balance", "debit_count", "credit_count")
+
 def _aggregate_statements_and_revenue(per_statement: List[Dict], state_for_rule: Optional[str]) -> Dict:
-    monthly_deposits: Dict[str, float] = {}
+    monthly_deposits = _rollup_monthly_deposits(per_statement)
     total_neg_days = 0
     adb_values: List[float] = []
     total_debits = 0
     total_credits = 0
     for s in per_statement:
-        for ym, amt in (s.get("_monthly_deposits") or {}).items():
-            try:
-                monthly_deposits[ym] = monthly_deposits.get(ym, 0.0) + float(amt)
-            except Exception:
-                pass
-        try: total_neg_days += int(s.get("negative_ending_days") or 0)
+        # Single C-level extraction of the scalar fields per statement.
+        # Summaries built in-process are already typed, but entries can
+        # also arrive from the client via existing_statements_json with
+        # string scalars, so keep the baseline's per-field coercion.
+        _md, neg_days, adb, debits, credits = _AGG_FIELDS({**_AGG_DEFAULTS, **s})
+        try: total_neg_days += int(neg_days or 0)
         except Exception: pass
-        try:
-            adb = s.get("average_daily_balance")
-            if adb is not None: adb_values.append(float(adb))
-        except Exception: pass
-        try: total_debits += int(s.get("debit_count") or 0)
+        if adb is not None:
+            try: adb_values.append(float(adb))
+            except Exception: pass
+        try: total_debits += int(debits or 0)
         except Exception: pass
-        try: total_credits += int(s.get("credit_count") or 0)
+        try: total_credits += int(credits or 0)
         except Exception: pass
     avg_adb = round(sum(adb_values) / len(adb_values), 2) if adb_values else None
     avg_revenue = stx.pick_avg_revenue(monthly_deposits, state_for_rule) if hasattr(stx, "pick_avg_revenue") else None
@@ -192,10 +293,14 @@ def _aggregate_statements_and_revenue(per_statement: List[Dict], state_for_rule:
         "average_daily_balance": avg_adb,
     }
 
-def _build_statements_payload(files: List[Tuple[str, bytes]], state_for_rule: Optional[str]) -> Dict:
+def _build_statements_payload(files: List[Tuple[str, Union[bytes, Callable[[], bytes]]]],
+                              state_for_rule: Optional[str]) -> Dict:
     per_statement: List[Dict] = []
-    for fname, pdf_bytes in files:
+    for fname, data in files:
         try:
+            # Entries may be lazy readers; materialize one statement at a
+            # time so peak RSS is bounded by a single PDF, not the batch.
+            pdf_bytes = data() if callable(data) else data
             summary_dict = _summarize_one_statement_from_bytes(pdf_bytes, filename=fname)
             per_statement.append(summary_dict)
         except Exception:
@@ -228,48 +333,112 @@ def _append_default_lenders(lenders: List[Dict]) -> List[Dict]:
 
 
 # Emails book + recipients
-_emails_cache = {"book": {}, "mtime": 0.0}
+_emails_cache = {"key": None, "book": {}, "trigrams": {}}
+
+def _trigram_set(key: str) -> set:
+    if len(key) < 3:
+        return {key} if key else set()
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+# Reserved index slot for book keys shorter than 3 chars ("gg", "bf"):
+# they have no 3-char gram a longer query could probe, so every lookup
+# unions this slot into its candidate set.
+_SHORT_KEY_GRAM = ""
+
+def _build_trigram_index(book: dict) -> Dict[str, set]:
+    idx: Dict[str, set] = {}
+    for k in book:
+        for g in _trigram_set(k):
+            idx.setdefault(g, set()).add(k)
+        if 0 < len(k) < 3:
+            idx.setdefault(_SHORT_KEY_GRAM, set()).add(k)
+    return idx
+
+_NORM_RE = re.compile(r"[^a-z0-9]+")
+_ADDR_SPLIT_RE = re.compile(r"[;,]")
 
-def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", (s or "").lower())
+def _split_emails(s: str):
+    return [e.strip() for e in _ADDR_SPLIT_RE.split(s or "") if e.strip()]
 
-def _parse_row_emails(s: str) -> List[str]:
-    return [e.strip() for e in str(s or "").split(",") if e and e.strip()]
+@functools.lru_cache(maxsize=4096)
+def _norm(s: str) -> str:
+    return _NORM_RE.sub("", (s or "").lower())
+
+# Known alternate spellings -> canonical lender names. Applied once when a
+# book is (re)built, so steady-state lookups never pay an alias pass.
+_LENDER_ALIASES = {
+    "broadwayadvance": "Broadway Advance",
+    "gg": "G&G",
+    "gandg": "G&G",
+    "tmrnow": "TMR Now",
+    "501advance": "501 Advance",
+    "quikstone": "Quikstone",
+    "quickstone": "Quikstone",
+}
+
+def _apply_lender_aliases(book: dict) -> dict:
+    for alias, canonical in _LENDER_ALIASES.items():
+        target = book.get(canonical.strip().lower()) or book.get(_norm(canonical))
+        if target is None:
+            continue
+        for akey in (alias.strip().lower(), _norm(alias)):
+            if akey not in book:
+                book[akey] = target
+    return book
 
-def load_emails_book() -> Dict[str, List[str]]:
-    try:
-        mtime = EMAILS_JSON_PATH.stat().st_mtime
-    except Exception:
-        _emails_cache["book"], _emails_cache["mtime"] = {}, 0.0
-        return {}
-    if mtime == _emails_cache["mtime"]:
-        return _emails_cache["book"]
+def _emails_book_cache_key(p: Optional[Path]) -> Optional[tuple]:
+    if not p:
+        return None
     try:
-        with EMAILS_JSON_PATH.open("r", encoding="utf-8") as f:
-            data = json.load(f) or {}
+        st = p.stat()
+        return (str(p), st.st_mtime_ns, st.st_size)
     except Exception:
-        log.exception("Failed reading %s", EMAILS_JSON_PATH)
-        _emails_cache["book"], _emails_cache["mtime"] = {}, 0.0
-        return {}
-    book: Dict[str, List[str]] = {}
-    rows = data.get("emails") if isinstance(data, dict) else None
-    if isinstance(rows, list):
-        for row in rows:
-            name = (row or {}).get("business_name")
-            emails_str = (row or {}).get("email") or (row or {}).get("emails") or ""
+        return None
+
+def _parse_user_emails_csv(p: Path) -> dict:
+    """Parse a per-user emails-book CSV into {lender: {"to": str, "cc": [...]}}."""
+    # Fast path: pandas does the header normalization and address splits in C.
+    if pd is not None:
+        try:
+            df = pd.read_csv(p, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+            df.columns = [str(c).strip().lower() for c in df.columns]
+            name_col = next((c for c in ("lender", "name", "business") if c in df.columns), None)
+            if name_col is None:
+                return {}
+            to_col = next((c for c in ("to", "email") if c in df.columns), None)
+            cc_col = next((c for c in ("cc", "ccs") if c in df.columns), None)
+            names = df[name_col].str.strip().str.lower()
+            tos = df[to_col].str.split(r"[;,]", regex=True) if to_col else None
+            ccs = df[cc_col].str.split(r"[;,]", regex=True) if cc_col else None
+            out = {}
+            for i, name in enumerate(names):
+                if not name:
+                    continue
+                to_parts = [e.strip() for e in (tos.iloc[i] if tos is not None else []) if e and e.strip()]
+                cc_parts = [e.strip() for e in (ccs.iloc[i] if ccs is not None else []) if e and e.strip()]
+                # If "to" has multiple addresses, pick the first as primary
+                out[name] = {"to": to_parts[0] if to_parts else "", "cc": cc_parts}
+            return out
+        except Exception:
+            traceback.print_exc()  # fall back to csv module
+
+    out = {}
+    with p.open("r", encoding="utf-8-sig", newline="") as fh:
+        reader = csv.DictReader(fh)
+        # normalize column names
+        for row in reader:
+            r = { (k or "").strip().lower(): (v or "").strip() for k,v in (row or {}).items() }
+            name = r.get("lender") or r.get("name") or r.get("business") or ""
             if not name:
                 continue
-            key = _norm(name)
-            addrs = _parse_row_emails(emails_str)
-            if addrs:
-                book[key] = addrs
-    aliases = {"broadwayadvance": "Broadway Advance","gg": "G&G","gandg": "G&G","tmrnow": "TMR Now","501advance": "501 Advance","quikstone": "Quikstone","quickstone": "Quikstone"}
-    for alias, canonical in aliases.items():
-        akey, ckey = _norm(alias), _norm(canonical)
-        if ckey in book and akey not in book:
-            book[akey] = book[ckey]
-    _emails_cache["book"], _emails_cache["mtime"] = book, mtime
-    return book
+            to_ = r.get("to") or r.get("email") or ""
+            cc_ = r.get("cc") or r.get("ccs") or ""
+            cc_list = _split_emails(cc_)
+            # If "to" has multiple addresses, pick the first as primary
+            to_parts = _split_emails(to_)
+            to_addr = to_parts[0] if to_parts else ""
+            out[name.strip().lower()] = {"to": to_addr, "cc": cc_list}
+    return out
 
 def load_emails_book() -> dict:
     """
@@ -283,24 +452,12 @@ def load_emails_book() -> dict:
     try:
         p = _user_emails_csv_path()
         if p and p.exists():
-            out = {}
-            with p.open("r", encoding="utf-8-sig", newline="") as fh:
-                reader = csv.DictReader(fh)
-                # normalize column names
-                for row in reader:
-                    r = { (k or "").strip().lower(): (v or "").strip() for k,v in (row or {}).items() }
-                    name = r.get("lender") or r.get("name") or r.get("business") or ""
-                    if not name:
-                        continue
-                    to_ = r.get("to") or r.get("email") or ""
-                    cc_ = r.get("cc") or r.get("ccs") or ""
-                    # split addresses by comma/semicolon
-                    def split_emails(s):
-                        return [e.strip() for e in re.split(r"[;,]", s or "") if e.strip()]
-                    cc_list = split_emails(cc_)
-                    # If "to" has multiple addresses, pick the first as primary
-                    to_addr = split_emails(to_)[0] if split_emails(to_) else ""
-                    out[name.strip().lower()] = {"to": to_addr, "cc": cc_list}
+            ck = _emails_book_cache_key(p)
+            if ck and _emails_cache.get("key") == ck:
+                return _emails_cache["book"]
+            out = _apply_lender_aliases(_parse_user_emails_csv(p))
+            _emails_cache["key"], _emails_cache["book"] = ck, out
+            _emails_cache["trigrams"] = _build_trigram_index(out)
             return out
     except Exception:
         traceback.print_exc()  # fall through to global json
@@ -309,7 +466,24 @@ def load_emails_book() -> dict:
     m = {}
     try:
         if EMAILS_JSON_PATH and EMAILS_JSON_PATH.exists():
-            raw = json.loads(EMAILS_JSON_PATH.read_text() or "{}")
+            ck = _emails_book_cache_key(EMAILS_JSON_PATH)
+            if ck and _emails_cache.get("key") == ck:
+                return _emails_cache["book"]
+            # Warm-start across process restarts: reuse the pickled book if
+            # it was built from this exact (path, mtime, size) of the JSON.
+            pkl = EMAILS_JSON_PATH.with_suffix(".pkl")
+            try:
+                if ck and pkl.exists():
+                    with pkl.open("rb") as fh:
+                        cached = pickle.load(fh)
+                    if isinstance(cached, dict) and cached.get("key") == ck:
+                        m = cached.get("book") or {}
+                        _emails_cache["key"], _emails_cache["book"] = ck, m
+                        _emails_cache["trigrams"] = _build_trigram_index(m)
+                        return m
+            except Exception:
+                pass
+            raw = _json_loads(EMAILS_JSON_PATH.read_bytes() or b"{}")
             if isinstance(raw, dict):
                 # could be {"LenderA": {"to": "...", "cc": [...]}, ...} or {"LenderA":"x@y.com"}
                 for k,v in raw.items():
@@ -321,7 +495,7 @@ def load_emails_book() -> dict:
                         to_ = v.get("to") or v.get("email") or ""
                         cc = v.get("cc") or []
                         if isinstance(cc, str):
-                            cc_list = [e.strip() for e in re.split(r"[;,]", cc) if e.strip()]
+                            cc_list = _split_emails(cc)
                         elif isinstance(cc, (list, tuple)):
                             cc_list = [str(e).strip() for e in cc if str(e).strip()]
                     m[k2] = {"to": to_, "cc": cc_list}
@@ -336,14 +510,22 @@ def load_emails_book() -> dict:
                     to_ = item.get("to") or item.get("email") or ""
                     cc = item.get("cc") or []
                     if isinstance(cc, str):
-                        cc_list = [e.strip() for e in re.split(r"[;,]", cc) if e.strip()]
+                        cc_list = _split_emails(cc)
                     elif isinstance(cc, (list, tuple)):
                         cc_list = [str(e).strip() for e in cc if str(e).strip()]
                     else:
                         cc_list = []
                     m[name] = {"to": to_, "cc": cc_list}
+            m = _apply_lender_aliases(m)
+            _emails_cache["key"], _emails_cache["book"] = ck, m
+            try:
+                with pkl.open("wb") as fh:
+                    pickle.dump({"key": ck, "book": m}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                pass
     except Exception:
         traceback.print_exc()
+    _emails_cache["trigrams"] = _build_trigram_index(m)
     return m
 
 def resolve_recipients(lender_name: str, extra_cc: Optional[List[str]] = None) -> Tuple[Optional[str], List[str]]:
@@ -351,9 +533,20 @@ def resolve_recipients(lender_name: str, extra_cc: Optional[List[str]] = None) -
     key = _norm(lender_name)
     addrs = book.get(key)
     if not addrs:
-        for k, v in book.items():
+        idx = _emails_cache.get("trigrams") or {}
+        if idx and len(key) >= 3:
+            candidates = set(idx.get(_SHORT_KEY_GRAM, ()))
+            for g in _trigram_set(key):
+                candidates |= idx.get(g, set())
+            # walk the book in insertion order, not the set — first-wins
+            # must stay deterministic across processes (set iteration
+            # order is hash-seeded)
+            scan = (k for k in book if k in candidates)
+        else:
+            scan = book.keys()
+        for k in scan:
             if key in k or k in key:
-                addrs = v
+                addrs = book[k]
                 break
     addrs = addrs or []
     to_email = addrs[0] if addrs and isinstance(addrs, list) else (addrs.get("to") if isinstance(addrs, dict) else None)
@@ -368,7 +561,7 @@ def resolve_recipients(lender_name: str, extra_cc: Optional[List[str]] = None) -
 def _load_google_token_from_disk(pref_email: Optional[str] = None) -> tuple[Optional[str], Optional[dict]]:
     try:
         if GOOGLE_TOKEN_FILE.exists():
-            data = json.loads(GOOGLE_TOKEN_FILE.read_text("utf-8"))
+            data = _json_loads(GOOGLE_TOKEN_FILE.read_bytes())
             if isinstance(data, dict) and data.get("email") and data.get("token"):
                 if not pref_email or data.get("email") == pref_email:
                     return data.get("email"), data
@@ -379,7 +572,7 @@ def _load_google_token_from_disk(pref_email: Optional[str] = None) -> tuple[Opti
             candidates = []
             for p in TOKENS_DIR.glob("*.json"):
                 try:
-                    d = json.loads(p.read_text("utf-8"))
+                    d = _json_loads(p.read_bytes())
                 except Exception:
                     continue
                 if isinstance(d, dict) and d.get("email") and d.get("token"):
@@ -398,8 +591,7 @@ def _legacy_get_connected_sender(user_id: str) -> Tuple[Optional[str], Optional[
     if not AUTH_STORE_PATH.exists():
         return None, None, None
     try:
-        with AUTH_STORE_PATH.open("r", encoding="utf-8") as f:
-            store = json.load(f) or {}
+        store = _json_loads(AUTH_STORE_PATH.read_bytes()) or {}
     except Exception:
         log.exception("Failed to read auth store")
         return None, None, None
@@ -446,9 +638,24 @@ def safe_get_connected_sender():
         return e2, "gmail", t2
     return None, None, None
 
-# Email sending helpers 
+# Email sending helpers
+def _encode_attachments(attachments: List[Tuple[str, bytes]]) -> List[Tuple[str, str, str]]:
+    """Base64-encode each attachment once per submission.
+
+    Returns (name, mime_b64, graph_b64) tuples: the CRLF-wrapped form for
+    MIME bodies and the bare form for Graph fileAttachments. Encoding here
+    means M lenders reuse the same encoded strings instead of re-encoding
+    MB-sized payloads per send.
+    """
+    out: List[Tuple[str, str, str]] = []
+    for fname, data in attachments or []:
+        out.append((fname,
+                    base64.encodebytes(data).decode("ascii"),
+                    base64.b64encode(data).decode("ascii")))
+    return out
+
 def _build_mime(subject: str, html_body: str, sender_email: str, to_email: str, cc_list: List[str],
-                attachments: List[Tuple[str, bytes]]) -> email.message.Message:
+                attachments: List[Tuple[str, str, str]]) -> email.message.Message:
     msg = email.mime.multipart.MIMEMultipart()
     msg["To"] = to_email
     if cc_list:
@@ -457,14 +664,14 @@ def _build_mime(subject: str, html_body: str, sender_email: str, to_email: str,
     msg["Subject"] = subject
     msg["Date"] = email.utils.formatdate(localtime=True)
     msg.attach(email.mime.text.MIMEText(html_body or "", "html", "utf-8"))
-    for fname, data in attachments or []:
+    for fname, mime_b64, _graph_b64 in attachments or []:
         ctype, enc = mimetypes.guess_type(fname)
         if ctype is None:
             ctype = "application/octet-stream"
         maintype, subtype = ctype.split("/", 1)
         part = email.mime.base.MIMEBase(maintype, subtype)
-        part.set_payload(data)
-        email.encoders.encode_base64(part)
+        part.set_payload(mime_b64)
+        part["Content-Transfer-Encoding"] = "base64"
         part.add_header("Content-Disposition", "attachment", filename=fname)
         msg.attach(part)
     return msg
@@ -511,7 +718,7 @@ def _google_refresh_access_token(td: dict) -> tuple[bool, dict | str]:
     if not (rt and cid and csec):
         return False, "missing_refresh_material"
     try:
-        r = requests.post(
+        r = _HTTP.post(
             token_uri,
             data={
                 "grant_type": "refresh_token",
@@ -538,9 +745,24 @@ def _google_refresh_access_token(td: dict) -> tuple[bool, dict | str]:
         td["expiry"] = (_time.time() + 55 * 60)
     return True, td
 
+# Validated-token cache so a batch of M sends flattens/refreshes once,
+# keyed by a hash of the refresh token. Entries die with their expiry.
+_token_cache: Dict[str, Tuple[float, dict]] = {}
+
+def _token_cache_key(td: dict) -> Optional[str]:
+    rt = td.get("refresh_token") or td.get("access_token") or td.get("token")
+    if not rt:
+        return None
+    return hashlib.sha256(str(rt).encode("utf-8")).hexdigest()
+
 def _ensure_google_access_token(token_dict: dict) -> tuple[bool, dict | str]:
     td = _flatten_google_token(token_dict)
     now = _time.time()
+    ck = _token_cache_key(td)
+    if ck:
+        hit = _token_cache.get(ck)
+        if hit and (hit[0] - now) > 60:
+            return True, hit[1]
     exp_epoch = _expiry_to_epoch(td.get("expiry"))
     tok = td.get("token") or td.get("access_token")
     needs_refresh = False
@@ -556,6 +778,10 @@ def _ensure_google_access_token(token_dict: dict) -> tuple[bool, dict | str]:
             return False, upd
         td = upd
     td["token"] = td.get("token") or td.get("access_token")
+    if ck:
+        exp_epoch = _expiry_to_epoch(td.get("expiry"))
+        if exp_epoch:
+            _token_cache[ck] = (exp_epoch, td)
     return True, td
 
 def gmail_send(token_dict: dict, subject: str, body_html: str,
@@ -570,18 +796,60 @@ def gmail_send(token_dict: dict, subject: str, body_html: str,
         return False, "gmail_error:no_access_token"
 
     msg = _build_mime(subject, body_html, sender_email, to_email, cc_list, attachments)
-    raw = base64.urlsafe_b64encode(msg.as_bytes(policy=email.policy.SMTP)).decode("utf-8")
+    buf = io.BytesIO()
+    email.generator.BytesGenerator(buf, policy=email.policy.SMTP).flatten(msg)
+
+    # Fast path: the upload endpoint takes the RFC 2822 message verbatim,
+    # skipping the whole-message base64 pass and the JSON wrapper.
+    # Only fall back to the metadata endpoint when the failure proves
+    # Gmail did NOT accept the message (connection never established, or
+    # an explicit 4xx rejection). A timeout after the body went out may
+    # mean the send succeeded — retrying there would email the lender
+    # twice — so it surfaces as an error instead.
+    try:
+        r = _HTTP.post(
+            "https://gmail.googleapis.com/upload/gmail/v1/users/me/messages/send?uploadType=media",
+            headers={"Authorization": f"Bearer {access_token}", "Content-Type": "message/rfc822"},
+            data=buf.getvalue(),
+            timeout=20,
+        )
+        if r.status_code in (200, 202):
+            try:
+                rid = r.json().get("id")
+            except Exception:
+                rid = None
+            return True, rid
+        if r.status_code == 401:
+            _token_cache.pop(_token_cache_key(td) or "", None)
+        if not (400 <= r.status_code < 500):
+            # 5xx is ambiguous about whether the message landed
+            return False, f"gmail_error:upload_http_{r.status_code}:{r.text[:300]}"
+    except requests.exceptions.Timeout:
+        return False, "gmail_error:upload_timeout"
+    except requests.exceptions.ConnectionError:
+        pass  # nothing reached Gmail; the fallback is a first attempt
+    except Exception as e:
+        return False, f"gmail_error:upload:{e}"
+
+    # Fallback: metadata endpoint with the base64url-encoded message.
+    # urlsafe base64 is JSON-safe, so assemble the body by hand instead of
+    # letting json.dumps re-scan the multi-MB encoded string.
+    raw = base64.urlsafe_b64encode(buf.getbuffer())
+    payload = b'{"raw":"' + raw + b'"}'
 
     try:
-        r = requests.post(
+        r = _HTTP.post(
             "https://gmail.googleapis.com/gmail/v1/users/me/messages/send",
             headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"},
-            json={"raw": raw},
+            data=payload,
             timeout=20,
         )
     except Exception as e:
         return False, f"gmail_error:http:{e}"
 
+    if r.status_code == 401:
+        # Token went bad mid-batch; drop it so the next send re-validates.
+        _token_cache.pop(_token_cache_key(td) or "", None)
     if r.status_code not in (200, 202):
         return False, f"gmail_error:http_{r.status_code}:{r.text[:300]}"
     try:
@@ -592,7 +860,7 @@ def gmail_send(token_dict: dict, subject: str, body_html: str,
 
 def graph_send(token_dict: dict, subject: str, body_html: str,
                sender_email: str, to_email: str, cc_list: List[str],
-               attachments: List[Tuple[str, bytes]]) -> Tuple[bool, Optional[str]]:
+               attachments: List[Tuple[str, str, str]]) -> Tuple[bool, Optional[str]]:
     access_token = token_dict.get("access_token") or token_dict.get("token")
     if not access_token:
         return False, "no_graph_access_token"
@@ -606,16 +874,16 @@ def graph_send(token_dict: dict, subject: str, body_html: str,
         "saveToSentItems": True
     }
     atts = []
-    for fname, data in attachments or []:
+    for fname, _mime_b64, graph_b64 in attachments or []:
         atts.append({
             "@odata.type": "#microsoft.graph.fileAttachment",
             "name": fname,
-            "contentBytes": base64.b64encode(data).decode("utf-8")
+            "contentBytes": graph_b64
         })
     if atts:
         msg["message"]["attachments"] = atts
     try:
-        r = requests.post(
+        r = _HTTP.post(
             "https://graph.microsoft.com/v1.0/me/sendMail",
             headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"},
             json=msg,
@@ -750,12 +1018,11 @@ def statements_and_match():
             return jsonify({"error": f"Need at least {min_files} statement PDFs for state {state}"}), 400
 
         saved_files: List[dict] = []
-        files_for_summary: List[Tuple[str, bytes]] = []
+        files_for_summary: List[Tuple[str, Callable[[], bytes]]] = []
         for f in stmt_files:
             saved = _save_upload(f, prefix="stmt")
             saved_files.append(saved)
-            with open(saved["path"], "rb") as fh:
-                files_for_summary.append((saved["filename"], fh.read()))
+            files_for_summary.append((saved["filename"], Path(saved["path"]).read_bytes))
 
         prev_json = request.form.get("existing_statements_json")
         prev = None
@@ -803,12 +1070,11 @@ def extract_and_match():
         application["_attachment"] = saved_app
 
         saved_files: List[dict] = []
-        files_for_summary: List[Tuple[str, bytes]] = []
+        files_for_summary: List[Tuple[str, Callable[[], bytes]]] = []
         for f in stmt_files:
             saved = _save_upload(f, prefix="stmt")
             saved_files.append(saved)
-            with open(saved["path"], "rb") as fh:
-                files_for_summary.append((saved["filename"], fh.read()))
+            files_for_summary.append((saved["filename"], Path(saved["path"]).read_bytes))
 
         statements_payload = _build_statements_payload(files_for_summary, state_for_rule=state or application.get("state"))
         statements_payload["_saved_files"] = saved_files
@@ -901,9 +1167,6 @@ def _parse_emails_csv_bytes(raw: bytes) -> dict:
     headers = { (h or "").strip().lower(): h for h in reader.fieldnames }
     def _get(row, key):
         return (row.get(headers.get(key, key), "") or "").strip()
-    def _split_emails(s):
-        parts = re.split(r"[;,]", s or "")
-        return [p.strip() for p in parts if p.strip()]
     for row in reader:
         lender = _get(row, "lender")
         if not lender:
@@ -1024,9 +1287,6 @@ def emails_book_upload():
 LENDER_ALIASES = {"lender","lender name","name","business","company","funder","provider"}
 TO_ALIASES     = {"to","email","primary","primary_email"}
 
-def _split_emails(s: str):
-    return [e.strip() for e in re.split(r"[;,]", s or "") if e.strip()]
-
 def _preview_emails_csv_text(text: str):
     text = text.replace("\r\n", "\n")
     lines = [ln for ln in text.split("\n") if ln.strip()]
@@ -1084,8 +1344,13 @@ def send_emails():
         application_obj = data.get("application") or {}
         statements_obj  = data.get("statements") or {}
 
-        attachments_global = _parse_attachments_from_json(data)
-        per_map = _parse_per_lender_attachments_from_json(data)
+        attachments_global = _encode_attachments(_parse_attachments_from_json(data))
+        # add_for() registers each file list under both the lender's exact
+        # and lowercased name; memoize by list identity so shared lists are
+        # encoded once, not once per key.
+        _enc_memo: Dict[int, list] = {}
+        per_map = {k: _enc_memo.setdefault(id(v), _encode_attachments(v))
+                   for k, v in _parse_per_lender_attachments_from_json(data).items()}
 
         if isinstance(user_cc, str):
             user_cc = [x.strip() for x in user_cc.split(",") if x.strip()]
@@ -1124,7 +1389,11 @@ def send_emails():
             except Exception:
                 pass
 
+        provider_key = (provider or "").lower()
+        send_fn = gmail_send if provider_key == "gmail" else (graph_send if provider_key in ("outlook", "graph") else None)
+
         deliveries = []
+        jobs = []  # (slot in deliveries, lname, to_email, cc_list, attachments)
         for lender in selected:
             lname = (lender or "").strip()
             lname_key = lname.lower()
@@ -1142,23 +1411,35 @@ def send_emails():
                 record_delivery(deal_id, lname, "", user_cc, provider or "", None, "skipped", sender_email)
                 continue
 
-            ok, provider_id = False, None
-            if (provider or "").lower() == "gmail":
-                ok, provider_id = gmail_send(token, final_subject, body, sender_email, to_email, cc_list, attachments=attachments_for_this)
-            elif (provider or "").lower() in ("outlook", "graph"):
-                ok, provider_id = graph_send(token, final_subject, body, sender_email, to_email, cc_list, attachments=attachments_for_this)
-            else:
+            if send_fn is None:
                 deliveries.append({"lender": lname, "from": sender_email, "to": to_email, "cc": cc_list,
                                    "status": "error", "reason": f"Unsupported provider {provider}"})
                 record_delivery(deal_id, lname, to_email, cc_list, provider or "", None, "error", sender_email)
                 continue
 
-            status = "sent" if ok else "error"
-            deliveries.append({
-                "lender": lname, "from": sender_email, "to": to_email, "cc": cc_list,
-                "status": status, "provider": (provider or ""), "provider_id": provider_id
-            })
-            record_delivery(deal_id, lname, to_email, cc_list, provider or "", provider_id, status, sender_email)
+            deliveries.append(None)  # filled in after the concurrent sends
+            jobs.append((len(deliveries) - 1, lname, to_email, cc_list, attachments_for_this))
+
+        if jobs:
+            # Sends are pure HTTPS I/O, so fan them out instead of paying
+            # one round-trip per lender. DB writes stay on this thread.
+            def _send_one(job):
+                _slot, _lname, job_to, job_cc, job_atts = job
+                try:
+                    return send_fn(token, final_subject, body, sender_email, job_to, job_cc, attachments=job_atts)
+                except Exception as e:
+                    return False, f"send_error:{e}"
+
+            with ThreadPoolExecutor(max_workers=min(8, len(jobs))) as pool:
+                results = list(pool.map(_send_one, jobs))
+
+            for (slot, lname, to_email, cc_list, _atts), (ok, provider_id) in zip(jobs, results):
+                status = "sent" if ok else "error"
+                deliveries[slot] = {
+                    "lender": lname, "from": sender_email, "to": to_email, "cc": cc_list,
+                    "status": status, "provider": (provider or ""), "provider_id": provider_id
+                }
+                record_delivery(deal_id, lname, to_email, cc_list, provider or "", provider_id, status, sender_email)
 
         return jsonify({"ok": True, "from": sender_email, "deal_id": deal_id, "subject": final_subject, "deliveries": deliveries})
     except Exception as e:
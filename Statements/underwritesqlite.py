@@ -12,8 +12,9 @@ from werkzeug.utils import secure_filename
 
 from flask import session, send_file, Response
 from pathlib import Path
-import csv, io, re, time
+import csv, functools, io, re, time
 import base64
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import email
 import email.policy
 import email.utils
@@ -33,6 +34,30 @@ from datetime import datetime, timezone
 import time as _time
 import secrets
 
+try:
+    import ijson  # optional: incremental JSON parsing for huge /send bodies
+except Exception:
+    ijson = None
+
+try:
+    import orjson  # optional: several times faster than stdlib json
+except Exception:
+    orjson = None
+
+def _json_loads(s):
+    return orjson.loads(s) if orjson is not None else json.loads(s)
+
+def _json_dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+def _json_response(payload, status: int = 200) -> Response:
+    """jsonify stand-in for heavy payloads; orjson emits bytes directly."""
+    if orjson is not None:
+        return Response(orjson.dumps(payload), status=status, mimetype="application/json")
+    return Response(json.dumps(payload), status=status, mimetype="application/json")
+
 # ---------- Paths & setup ----------
 BASE_DIR = Path(__file__).resolve().parent
 UPLOAD_DIR = BASE_DIR / "uploads"
@@ -51,6 +76,15 @@ bp = Blueprint("underwrite", __name__)
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("underwrite")
 
+# Shared keep-alive session: all deliveries in a batch reuse pooled TLS
+# connections to Gmail/Graph instead of handshaking per message.
+_HTTP = requests.Session()
+_HTTP.mount("https://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+# Background executor for /send delivery batches; a couple of workers is
+# plenty since each batch fans out on its own pool.
+_SEND_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
 # ---------- Import your modules ----------
 try:
     import Application_extractor as appx
@@ -76,11 +110,17 @@ except Exception as e:
 def _db():
     conn = sqlite3.connect(str(DEALS_DB_PATH))
     conn.row_factory = sqlite3.Row
+    # WAL is set once at init; NORMAL is per-connection and safe under WAL.
+    try: conn.execute("PRAGMA synchronous=NORMAL")
+    except Exception: pass
     return conn
 
 def _init_db():
     conn = _db()
     cur = conn.cursor()
+    # WAL lets gunicorn workers read while another commits.
+    try: cur.execute("PRAGMA journal_mode=WAL")
+    except Exception: pass
     cur.execute("""
         CREATE TABLE IF NOT EXISTS deals (
           id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -96,6 +136,14 @@ def _init_db():
           resend_count INTEGER DEFAULT 0
         )
     """)
+    # Lazy migration for DBs created before resend_count existed; doing it
+    # here keeps schema-locking ALTERs off the request path.
+    try:
+        cols = {r[1] for r in cur.execute("PRAGMA table_info(deals)").fetchall()}
+        if "resend_count" not in cols:
+            cur.execute("ALTER TABLE deals ADD COLUMN resend_count INTEGER DEFAULT 0")
+    except Exception:
+        pass
     cur.execute("""
         CREATE TABLE IF NOT EXISTS deliveries (
           id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -110,6 +158,12 @@ def _init_db():
           FOREIGN KEY(deal_id) REFERENCES deals(id)
         )
     """)
+    # covers the SUM(CASE WHEN status=...) aggregation in /deals
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_deliveries_deal_status ON deliveries(deal_id, status)")
+    # /deals/<id>/deliveries lookup
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_deliveries_deal_id ON deliveries(deal_id)")
+    # ORDER BY d.id DESC page scans per user
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_deals_user_id ON deals(user_id, id DESC)")
     conn.commit()
     conn.close()
 
@@ -137,9 +191,9 @@ def record_deal(
             body,
             (mode or ""),
             int(time.time()),
-            json.dumps(application_json or {}),
-            json.dumps(statements_json or {}),
-            json.dumps(attachments_json or {}),
+            _json_dumps(application_json or {}),
+            _json_dumps(statements_json or {}),
+            _json_dumps(attachments_json or {}),
         ),
     )
     deal_id = cur.lastrowid
@@ -155,17 +209,22 @@ def record_delivery(
     provider: str,
     provider_msg_id: Optional[str],
     status: str,
+    conn: Optional[sqlite3.Connection] = None,
 ) -> int:
-    conn = _db()
-    cur = conn.cursor()
-    cur.execute(
+    # When a connection is passed in, the caller owns the transaction and
+    # commits once for the whole batch (one fsync instead of one per row).
+    own = conn is None
+    if own:
+        conn = _db()
+    cur = conn.execute(
         "INSERT INTO deliveries (deal_id, lender_name, to_email, cc_csv, provider, provider_msg_id, status, created_at) "
         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
         (deal_id, lender_name, to_email or "", ",".join(cc_list or []), provider, provider_msg_id or "", status, int(time.time())),
     )
     rid = cur.lastrowid
-    conn.commit()
-    conn.close()
+    if own:
+        conn.commit()
+        conn.close()
     return rid
 
 # =========================================================
@@ -181,6 +240,46 @@ def _save_upload(fs_obj, prefix: str = "") -> dict:
     fs_obj.save(path)
     return {"path": str(path), "filename": name}
 
+def _save_upload_bytes(filename: str, raw: bytes, prefix: str = "") -> dict:
+    """Write already-read upload bytes to uploads/ and return dict(path, filename).
+
+    Lets callers keep the one in-memory copy for parsing instead of
+    saving via FileStorage and re-reading the file from disk.
+    """
+    name = _unique_name(f"{prefix}_{filename or 'file'}")
+    path = UPLOAD_DIR / name
+    path.write_bytes(raw)
+    return {"path": str(path), "filename": name}
+
+def _save_upload_bytes_many(items: List[Tuple[str, bytes]], prefix: str = "") -> List[dict]:
+    """Write a batch of already-read uploads, overlapping the disk writes
+    on a small thread pool (write_bytes releases the GIL) so a 4-PDF
+    upload costs roughly max() of the writes instead of their sum.
+    Results come back in input order."""
+    if len(items) <= 1:
+        return [_save_upload_bytes(n, r, prefix=prefix) for n, r in items]
+    with ThreadPoolExecutor(max_workers=min(len(items), 8)) as pool:
+        return list(pool.map(lambda it: _save_upload_bytes(it[0], it[1], prefix=prefix), items))
+
+@bp.get("/uploads/<path:name>")
+def serve_upload(name: str):
+    """Serve a stored artifact from uploads/. conditional=True lets the
+    WSGI layer answer range / If-Modified-Since requests (and plays nice
+    with nginx X-Accel-Redirect) instead of round-tripping the bytes
+    through Python."""
+    try:
+        path = (UPLOAD_DIR / name).resolve()
+        if not str(path).startswith(str(UPLOAD_DIR.resolve()) + os.sep) or not path.is_file():
+            return jsonify({"error": "not found"}), 404
+        return send_file(path, conditional=True, download_name=path.name)
+    except Exception as e:
+        log.exception("serve_upload failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+_MONTHS_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*months?")
+_YEARS_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*years?")
+_PAREN_YEARS_RE = re.compile(r"\(([0-9]+(?:\.[0-9]+)?)\s*years?\)")
+
 def _inject_length_months(application: dict) -> dict:
     app = dict(application or {})
     lm = app.get("length_months")
@@ -194,15 +293,15 @@ def _inject_length_months(application: dict) -> dict:
         app["length_months"] = None
         return app
     txt_low = txt.lower()
-    m = re.search(r"([0-9]+(?:\.[0-9]+)?)\s*months?", txt_low)
+    m = _MONTHS_RE.search(txt_low)
     if m:
         try: app["length_months"] = float(m.group(1)); return app
         except Exception: pass
-    y = re.search(r"([0-9]+(?:\.[0-9]+)?)\s*years?", txt_low)
+    y = _YEARS_RE.search(txt_low)
     if y:
         try: app["length_months"] = float(y.group(1)) * 12.0; return app
         except Exception: pass
-    y2 = re.search(r"\(([0-9]+(?:\.[0-9]+)?)\s*years?\)", txt_low)
+    y2 = _PAREN_YEARS_RE.search(txt_low)
     if y2:
         try: app["length_months"] = float(y2.group(1)) * 12.0; return app
         except Exception: pass
@@ -283,14 +382,29 @@ def _aggregate_statements_and_revenue(per_statement: List[Dict], state_for_rule:
         "average_daily_balance": avg_adb,
     }
 
+def _parse_one_statement(args: Tuple[str, bytes]) -> Optional[Dict]:
+    fname, pdf_bytes = args
+    try:
+        return _summarize_one_statement_from_bytes(pdf_bytes, filename=fname)
+    except Exception:
+        log.exception("Failed to summarize statement: %s", fname)
+        return None
+
 def _build_statements_payload(files: List[Tuple[str, bytes]], state_for_rule: Optional[str]) -> Dict:
-    per_statement: List[Dict] = []
-    for fname, pdf_bytes in files:
+    # PDF parsing is CPU-bound pure Python, so fan multi-file batches out
+    # across processes; order is preserved by map(). Falls back to the
+    # serial loop on any executor failure (e.g. constrained hosts).
+    parsed: Optional[List[Optional[Dict]]] = None
+    if len(files) > 1:
         try:
-            summary_dict = _summarize_one_statement_from_bytes(pdf_bytes, filename=fname)
-            per_statement.append(summary_dict)
+            with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as pool:
+                parsed = list(pool.map(_parse_one_statement, files))
         except Exception:
-            log.exception("Failed to summarize statement: %s", fname)
+            log.exception("Parallel statement parse failed; reverting to serial")
+            parsed = None
+    if parsed is None:
+        parsed = [_parse_one_statement(f) for f in files]
+    per_statement: List[Dict] = [r for r in parsed if r]
     aggregates = _aggregate_statements_and_revenue(per_statement, state_for_rule)
     for s in per_statement:
         s.pop("_monthly_deposits", None)
@@ -311,12 +425,15 @@ def _match_lenders(application: Dict, statements: Dict) -> List[Dict]:
         log.exception("Error when generating lenders")
         return []
 
+_DEFAULT_LENDERS = (
+    {"business_name": "test", "score": 1.0, "reason": "Default test lender"},
+    {"business_name": "testing", "score": 1.0, "reason": "Default test lender"},
+)
+
 def _append_default_lenders(lenders: List[Dict]) -> List[Dict]:
     lenders = list(lenders or [])
     have = {(x.get("business_name") or "").strip().lower() for x in lenders}
-    for nm in ("test", "testing"):
-        if nm not in have:
-            lenders.append({"business_name": nm, "score": 1.0, "reason": "Default test lender"})
+    lenders.extend(dict(d) for d in _DEFAULT_LENDERS if d["business_name"] not in have)
     return lenders
 
 # =========================================================
@@ -324,8 +441,11 @@ def _append_default_lenders(lenders: List[Dict]) -> List[Dict]:
 # =========================================================
 _emails_cache = {"book": {}, "mtime": 0.0}
 
+_NORM_RE = re.compile(r"[^a-z0-9]+")
+_SPLIT_EMAILS_RE = re.compile(r"[;,]")
+
 def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "", (s or "").lower())
+    return _NORM_RE.sub("", (s or "").lower())
 
 def _parse_row_emails(s: str) -> List[str]:
     return [e.strip() for e in str(s or "").split(",") if e and e.strip()]
@@ -390,7 +510,7 @@ def load_emails_book() -> dict:
                     cc_ = r.get("cc") or r.get("ccs") or ""
                     # split addresses by comma/semicolon
                     def split_emails(s):
-                        return [e.strip() for e in re.split(r"[;,]", s or "") if e.strip()]
+                        return [e.strip() for e in _SPLIT_EMAILS_RE.split(s or "") if e.strip()]
                     cc_list = split_emails(cc_)
                     # If "to" has multiple addresses, pick the first as primary
                     to_addr = split_emails(to_)[0] if split_emails(to_) else ""
@@ -403,7 +523,7 @@ def load_emails_book() -> dict:
     m = {}
     try:
         if EMAILS_JSON_PATH and EMAILS_JSON_PATH.exists():
-            raw = json.loads(EMAILS_JSON_PATH.read_text() or "{}")
+            raw = _json_loads(EMAILS_JSON_PATH.read_text() or "{}")
             if isinstance(raw, dict):
                 # could be {"LenderA": {"to": "...", "cc": [...]}, ...} or {"LenderA":"x@y.com"}
                 for k,v in raw.items():
@@ -415,7 +535,7 @@ def load_emails_book() -> dict:
                         to_ = v.get("to") or v.get("email") or ""
                         cc = v.get("cc") or []
                         if isinstance(cc, str):
-                            cc_list = [e.strip() for e in re.split(r"[;,]", cc) if e.strip()]
+                            cc_list = [e.strip() for e in _SPLIT_EMAILS_RE.split(cc) if e.strip()]
                         elif isinstance(cc, (list, tuple)):
                             cc_list = [str(e).strip() for e in cc if str(e).strip()]
                     m[k2] = {"to": to_, "cc": cc_list}
@@ -430,7 +550,7 @@ def load_emails_book() -> dict:
                     to_ = item.get("to") or item.get("email") or ""
                     cc = item.get("cc") or []
                     if isinstance(cc, str):
-                        cc_list = [e.strip() for e in re.split(r"[;,]", cc) if e.strip()]
+                        cc_list = [e.strip() for e in _SPLIT_EMAILS_RE.split(cc) if e.strip()]
                     elif isinstance(cc, (list, tuple)):
                         cc_list = [str(e).strip() for e in cc if str(e).strip()]
                     else:
@@ -461,7 +581,7 @@ def resolve_recipients(lender_name: str, extra_cc: Optional[List[str]] = None) -
 def _load_google_token_from_disk(pref_email: Optional[str] = None) -> tuple[Optional[str], Optional[dict]]:
     try:
         if GOOGLE_TOKEN_FILE.exists():
-            data = json.loads(GOOGLE_TOKEN_FILE.read_text("utf-8"))
+            data = _json_loads(GOOGLE_TOKEN_FILE.read_text("utf-8"))
             if isinstance(data, dict) and data.get("email") and data.get("token"):
                 if not pref_email or data.get("email") == pref_email:
                     return data.get("email"), data
@@ -472,7 +592,7 @@ def _load_google_token_from_disk(pref_email: Optional[str] = None) -> tuple[Opti
             candidates = []
             for p in TOKENS_DIR.glob("*.json"):
                 try:
-                    d = json.loads(p.read_text("utf-8"))
+                    d = _json_loads(p.read_text("utf-8"))
                 except Exception:
                     continue
                 if isinstance(d, dict) and d.get("email") and d.get("token"):
@@ -606,7 +726,7 @@ def _google_refresh_access_token(td: dict) -> tuple[bool, dict | str]:
     if not (rt and cid and csec):
         return False, "missing_refresh_material"
     try:
-        r = requests.post(
+        r = _HTTP.post(
             token_uri,
             data={
                 "grant_type": "refresh_token",
@@ -668,7 +788,7 @@ def gmail_send(token_dict: dict, subject: str, body_html: str,
     raw = base64.urlsafe_b64encode(msg.as_bytes(policy=email.policy.SMTP)).decode("utf-8")
 
     try:
-        r = requests.post(
+        r = _HTTP.post(
             "https://gmail.googleapis.com/gmail/v1/users/me/messages/send",
             headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"},
             json={"raw": raw},
@@ -710,7 +830,7 @@ def graph_send(token_dict: dict, subject: str, body_html: str,
     if atts:
         msg["message"]["attachments"] = atts
     try:
-        r = requests.post(
+        r = _HTTP.post(
             "https://graph.microsoft.com/v1.0/me/sendMail",
             headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"},
             json=msg,
@@ -748,7 +868,7 @@ def statements_and_match():
         if not application_json:
             return jsonify({"error": "Missing application_json"}), 400
         try:
-            application = json.loads(application_json) or {}
+            application = _json_loads(application_json) or {}
             if not isinstance(application, dict):
                 return jsonify({"error": "application_json must be a JSON object"}), 400
         except Exception:
@@ -764,22 +884,19 @@ def statements_and_match():
         if not stmt_files or len(stmt_files) < min_files:
             return jsonify({"error": f"Need at least {min_files} statement PDFs for state {state}"}), 400
 
-        # Save the uploaded statements; also build data for analysis
-        saved_files: List[dict] = []
-        files_for_summary: List[Tuple[str, bytes]] = []
-        for f in stmt_files:
-            saved = _save_upload(f, prefix="stmt")
-            saved_files.append(saved)
-            # read back for summary
-            with open(saved["path"], "rb") as fh:
-                files_for_summary.append((saved["filename"], fh.read()))
+        # Save the uploaded statements; also build data for analysis.
+        # Bytes are captured once and shared between the disk write and
+        # the summary pass, avoiding the save/re-read round trip.
+        raws = [(f.filename, f.read()) for f in stmt_files]
+        saved_files = _save_upload_bytes_many(raws, prefix="stmt")
+        files_for_summary = [(s["filename"], raw) for s, (_n, raw) in zip(saved_files, raws)]
 
         # Combine with any previous statements if provided (resend merge)
         prev_json = request.form.get("existing_statements_json")
         prev = None
         if prev_json:
             try:
-                prev = json.loads(prev_json) or {}
+                prev = _json_loads(prev_json) or {}
             except Exception:
                 prev = None
 
@@ -787,9 +904,14 @@ def statements_and_match():
         statements_new["_saved_files"] = saved_files
 
         if prev and isinstance(prev, dict):
-            combined_per = (prev.get("per_statement") or []) + (statements_new.get("per_statement") or [])
+            # prev was parsed from this request's form data, so its lists are
+            # locally owned — extend in place instead of concatenating fresh
+            # copies of every prior entry on each resend
+            combined_per = prev.get("per_statement") or []
+            combined_per.extend(statements_new.get("per_statement") or [])
             # merge saved files too
-            combined_files = (prev.get("_saved_files") or []) + saved_files
+            combined_files = prev.get("_saved_files") or []
+            combined_files.extend(saved_files)
             aggregates = _aggregate_statements_and_revenue(combined_per, state_for_rule=state)
             statements_payload = {"per_statement": combined_per, **aggregates, "_saved_files": combined_files}
         else:
@@ -821,13 +943,9 @@ def extract_and_match():
         application = _extract_application_fields(Path(saved_app["path"]))
         application["_attachment"] = saved_app
 
-        saved_files: List[dict] = []
-        files_for_summary: List[Tuple[str, bytes]] = []
-        for f in stmt_files:
-            saved = _save_upload(f, prefix="stmt")
-            saved_files.append(saved)
-            with open(saved["path"], "rb") as fh:
-                files_for_summary.append((saved["filename"], fh.read()))
+        raws = [(f.filename, f.read()) for f in stmt_files]
+        saved_files = _save_upload_bytes_many(raws, prefix="stmt")
+        files_for_summary = [(s["filename"], raw) for s, (_n, raw) in zip(saved_files, raws)]
 
         statements_payload = _build_statements_payload(files_for_summary, state_for_rule=state or application.get("state"))
         statements_payload["_saved_files"] = saved_files
@@ -857,7 +975,7 @@ def send_emails():
     }
     """
     try:
-        data = request.get_json(force=True) or {}
+        data = _read_json_payload()
         selected = data.get("selected_lenders") or []
         subject  = data.get("subject") or ""        # may be blank or contain #DealID
         body     = data.get("message") or ""
@@ -867,10 +985,13 @@ def send_emails():
         application_obj = data.get("application") or {}
         statements_obj  = data.get("statements") or {}
 
-        # Global attachments (fallback for lenders without their own)
-        attachments_global = _parse_attachments_from_json(data)
+        # Global attachments (fallback for lenders without their own);
+        # one shared decode cache covers the same file appearing in both
+        # the global list and several per-lender entries
+        b64_cache: dict = {}
+        attachments_global = _parse_attachments_from_json(data, b64_cache)
         # Per-lender attachments
-        per_map = _parse_per_lender_attachments_from_json(data)
+        per_map = _parse_per_lender_attachments_from_json(data, b64_cache)
 
         if isinstance(user_cc, str):
             user_cc = [x.strip() for x in user_cc.split(",") if x.strip()]
@@ -890,95 +1011,129 @@ def send_emails():
             statements_json=statements_obj
         )
 
-        # Compute final subject (default or #DealID replacement), and persist if changed
-        final_subject = _default_subject(application_obj.get("business_name"), deal_id, subject)
-        if final_subject != subject:
-            try:
-                conn = _db()
-                conn.execute("UPDATE deals SET subject=? WHERE id=?", (final_subject, deal_id))
-                conn.commit()
-            except Exception:
-                pass
-            finally:
-                try: conn.close()
-                except: pass
-
-        # Resend de-dupe
-        exclude = set([(s or "").strip().lower() for s in (data.get("exclude") or []) if s])
-        parent_deal_id = data.get("parent_deal_id")
-        if parent_deal_id and not exclude:
-            try:
-                conn = _db()
-                rows = conn.execute(
-                    "SELECT DISTINCT lender_name FROM deliveries WHERE deal_id=?",
-                    (parent_deal_id,)
-                ).fetchall()
-                exclude = set([(r["lender_name"] or "").strip().lower() for r in rows])
-                # ensure resend_count column and bump it
+        # One connection for every write in this request: the pre-send batch
+        # (subject, resend bump, skip rows) commits before the HTTP fan-out so
+        # the write lock is not held across slow provider calls, and the
+        # post-send delivery rows commit once at the end.
+        conn = _db()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+
+            # Compute final subject (default or #DealID replacement), and persist if changed
+            final_subject = _default_subject(application_obj.get("business_name"), deal_id, subject)
+            if final_subject != subject:
                 try:
-                    conn.execute("ALTER TABLE deals ADD COLUMN resend_count INTEGER DEFAULT 0")
+                    conn.execute("UPDATE deals SET subject=? WHERE id=?", (final_subject, deal_id))
                 except Exception:
                     pass
+
+            # Resend de-dupe
+            exclude = set([(s or "").strip().lower() for s in (data.get("exclude") or []) if s])
+            parent_deal_id = data.get("parent_deal_id")
+            if parent_deal_id and not exclude:
                 try:
+                    rows = conn.execute(
+                        "SELECT DISTINCT lender_name FROM deliveries WHERE deal_id=?",
+                        (parent_deal_id,)
+                    ).fetchall()
+                    exclude = set([(r["lender_name"] or "").strip().lower() for r in rows])
                     conn.execute("UPDATE deals SET resend_count = COALESCE(resend_count,0)+1 WHERE id=?", (parent_deal_id,))
-                    conn.commit()
                 except Exception:
                     pass
-            except Exception:
-                pass
-            finally:
-                try: conn.close()
-                except: pass
-
-        deliveries = []
-        for lender in selected:
-            lname = (lender or "").strip()
-            lname_key = lname.lower()
-
-            if lname_key in exclude:
-                deliveries.append({"lender": lname, "from": sender_email, "status": "skipped", "reason": "already sent"})
-                record_delivery(deal_id, lname, "", user_cc, provider or "", None, "skipped")
-                continue
 
-            # choose attachments for this lender
-            attachments_for_this = per_map.get(lname) or per_map.get(lname_key) or attachments_global
+            provider_key = (provider or "").lower()
+            send_fn = gmail_send if provider_key == "gmail" else (graph_send if provider_key in ("outlook", "graph") else None)
 
-            to_email, cc_list = resolve_recipients_user_csv_first(lname, user_cc)
-            if not to_email:
-                deliveries.append({"lender": lname, "from": sender_email, "status": "skipped",
-                                   "reason": "No recipient email in emails.json"})
-                record_delivery(deal_id, lname, "", user_cc, provider or "", None, "skipped")
-                continue
+            deliveries = []
+            jobs = []  # (delivery row id, lname, to_email, cc_list, attachments)
+            for lender in selected:
+                lname = (lender or "").strip()
+                lname_key = lname.lower()
 
-            ok, provider_id = False, None
-            if (provider or "").lower() == "gmail":
-                ok, provider_id = gmail_send(token, final_subject, body, sender_email, to_email, cc_list, attachments=attachments_for_this)
-            elif (provider or "").lower() in ("outlook", "graph"):
-                ok, provider_id = graph_send(token, final_subject, body, sender_email, to_email, cc_list, attachments=attachments_for_this)
-            else:
-                deliveries.append({"lender": lname, "from": sender_email, "to": to_email, "cc": cc_list,
-                                   "status": "error", "reason": f"Unsupported provider {provider}"})
-                record_delivery(deal_id, lname, to_email, cc_list, provider or "", None, "error")
-                continue
+                if lname_key in exclude:
+                    deliveries.append({"lender": lname, "from": sender_email, "status": "skipped", "reason": "already sent"})
+                    record_delivery(deal_id, lname, "", user_cc, provider or "", None, "skipped", conn=conn)
+                    continue
 
-            status = "sent" if ok else "error"
-            deliveries.append({
-                "lender": lname, "from": sender_email, "to": to_email, "cc": cc_list,
-                "status": status, "provider": (provider or ""), "provider_id": provider_id
-            })
-            record_delivery(deal_id, lname, to_email, cc_list, provider or "", provider_id, status)
+                # choose attachments for this lender
+                attachments_for_this = per_map.get(lname) or per_map.get(lname_key) or attachments_global
+
+                to_email, cc_list = resolve_recipients_user_csv_first(lname, user_cc)
+                if not to_email:
+                    deliveries.append({"lender": lname, "from": sender_email, "status": "skipped",
+                                       "reason": "No recipient email in emails.json"})
+                    record_delivery(deal_id, lname, "", user_cc, provider or "", None, "skipped", conn=conn)
+                    continue
+
+                if send_fn is None:
+                    deliveries.append({"lender": lname, "from": sender_email, "to": to_email, "cc": cc_list,
+                                       "status": "error", "reason": f"Unsupported provider {provider}"})
+                    record_delivery(deal_id, lname, to_email, cc_list, provider or "", None, "error", conn=conn)
+                    continue
 
-        return jsonify({
+                # queue the row now; the background batch flips it to
+                # sent/error and the UI polls /deals/<id>/deliveries
+                rid = record_delivery(deal_id, lname, to_email, cc_list, provider or "", None, "queued", conn=conn)
+                deliveries.append({
+                    "lender": lname, "from": sender_email, "to": to_email, "cc": cc_list,
+                    "status": "queued", "provider": (provider or "")
+                })
+                jobs.append((rid, lname, to_email, cc_list, attachments_for_this))
+
+            conn.commit()
+        finally:
+            try: conn.close()
+            except: pass
+
+        # Hand the provider round-trips to the background executor and
+        # return immediately instead of holding a WSGI worker for the
+        # whole batch.
+        if jobs:
+            _SEND_EXECUTOR.submit(
+                _run_send_batch, jobs, send_fn, token, final_subject, body, sender_email, provider_key
+            )
+
+        return _json_response({
             "ok": True,
             "from": sender_email,
             "deal_id": deal_id,
             "subject": final_subject,
+            "queued": len(jobs),
             "deliveries": deliveries
         })
     except Exception as e:
         log.exception("send_emails failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def _run_send_batch(jobs, send_fn, token, subject, body, sender_email, provider_key):
+    """Deliver one /send batch off the request thread: fan the provider
+    calls out on a pool, then flip the queued delivery rows to
+    sent/error in a single commit."""
+    def _send_one(job):
+        _rid, _lname, job_to, job_cc, job_atts = job
+        try:
+            return send_fn(token, subject, body, sender_email, job_to, job_cc, attachments=job_atts)
+        except Exception as e:
+            return False, f"send_error:{e}"
+
+    try:
+        max_workers = 15 if provider_key == "gmail" else 4
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+            results = list(pool.map(_send_one, jobs))
+
+        conn = _db()
+        try:
+            for (rid, _lname, _to, _cc, _atts), (ok, provider_id) in zip(jobs, results):
+                conn.execute(
+                    "UPDATE deliveries SET status=?, provider_msg_id=? WHERE id=?",
+                    ("sent" if ok else "error", provider_id or "", rid),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception:
+        log.exception("Background send batch failed")
+
 # --- Dashboard APIs -----------------------------------------------------------
 @bp.get("/deals")
 def list_deals():
@@ -991,7 +1146,7 @@ def list_deals():
         cur = conn.cursor()
         select_sql = """
             SELECT d.id, d.user_id, d.sender_email, d.subject, d.mode, d.created_at,
-                   d.application_json,
+                   json_extract(d.application_json, '$.business_name') AS business_name,
                    COALESCE(SUM(CASE WHEN del.status='sent'    THEN 1 ELSE 0 END),0) AS sent_count,
                    COALESCE(SUM(CASE WHEN del.status='error'   THEN 1 ELSE 0 END),0) AS error_count,
                    COALESCE(SUM(CASE WHEN del.status='skipped' THEN 1 ELSE 0 END),0) AS skipped_count,
@@ -1027,17 +1182,14 @@ def list_deals():
 
         deals = []
         for r in rows:
-            app_json = {}
-            try:
-                app_json = json.loads(r["application_json"] or "{}")
-            except Exception:
-                app_json = {}
             deals.append({
                 "id": r["id"],
                 "user_id": r["user_id"],
                 "sender_email": r["sender_email"],
                 "subject": r["subject"],
-                "business_name": (app_json or {}).get("business_name"),
+                # extracted DB-side: avoids re-parsing the full application
+                # JSON per row and shipping it out of SQLite at all
+                "business_name": r["business_name"],
                 "mode": r["mode"],
                 "created_at": r["created_at"],
                 "sent_count": r["sent_count"],
@@ -1048,7 +1200,7 @@ def list_deals():
                 "has_stmts": r["has_stmts"],
                 "resend_count": r["resend_count"],
             })
-        return jsonify({"deals": deals})
+        return _json_response({"deals": deals})
     except Exception as e:
         log.exception("list_deals failed: %s", e)
         return jsonify({"error": str(e)}), 500
@@ -1067,22 +1219,20 @@ def list_deliveries(deal_id: int):
             """,
             (deal_id,),
         )
-        rows = cur.fetchall()
+        # iterate the cursor directly — fetchall() would materialize the
+        # row list once just to walk it again
+        deliveries = [{
+            "id": r["id"],
+            "lender": r["lender_name"],
+            "to": r["to_email"],
+            "cc": [s for s in r["cc_csv"].split(",") if s] if r["cc_csv"] else [],
+            "provider": r["provider"],
+            "provider_id": r["provider_msg_id"],
+            "status": r["status"],
+            "created_at": r["created_at"],
+        } for r in cur]
         conn.close()
-
-        deliveries = []
-        for r in rows:
-            deliveries.append({
-                "id": r["id"],
-                "lender": r["lender_name"],
-                "to": r["to_email"],
-                "cc": [s for s in (r["cc_csv"] or "").split(",") if s],
-                "provider": r["provider"],
-                "provider_id": r["provider_msg_id"],
-                "status": r["status"],
-                "created_at": r["created_at"],
-            })
-        return jsonify({"deliveries": deliveries})
+        return _json_response({"deliveries": deliveries})
     except Exception as e:
         log.exception("list_deliveries failed: %s", e)
         return jsonify({"error": str(e)}), 500
@@ -1099,26 +1249,26 @@ def get_deal(deal_id: int):
 
     deal = dict(row)
     try:
-        deal["application"] = json.loads(deal.get("application_json") or "{}")
+        deal["application"] = _json_loads(deal.get("application_json") or "{}")
     except Exception:
         deal["application"] = {}
     try:
-        deal["statements"]  = json.loads(deal.get("statements_json") or "{}")
+        deal["statements"]  = _json_loads(deal.get("statements_json") or "{}")
     except Exception:
         deal["statements"] = {}
     try:
-        deal["attachments"] = json.loads(deal.get("attachments_json") or "{}")
+        deal["attachments"] = _json_loads(deal.get("attachments_json") or "{}")
     except Exception:
         deal["attachments"] = {}
 
     cur.execute("""SELECT lender_name as lender, to_email, cc_csv, provider, provider_msg_id, status, created_at
                    FROM deliveries WHERE deal_id=? ORDER BY created_at ASC""", (deal_id,))
-    deal["deliveries"] = [dict(r) for r in cur.fetchall()]
+    deal["deliveries"] = [dict(r) for r in cur]
 
     conn.close()
     for k in ("application_json","statements_json","attachments_json"):
         deal.pop(k, None)
-    return jsonify({"deal": deal})
+    return _json_response({"deal": deal})
 
 @bp.post("/rematch")
 def rematch():
@@ -1135,8 +1285,41 @@ def rematch():
     except Exception as e:
         log.exception("rematch failed: %s", e)
         return jsonify({"error": str(e)}), 500
+# ---- request-body helper ----
+_STREAM_JSON_THRESHOLD = 1 << 20  # 1 MB
+
+def _read_json_payload() -> dict:
+    """Parse the request body. Large bodies (multi-MB base64 PDFs) go
+    through ijson so top-level keys are built one at a time off the WSGI
+    stream instead of buffering the full text plus a parse tree at once;
+    small bodies keep the plain get_json fast path."""
+    if ijson is not None:
+        try:
+            clen = int(request.headers.get("Content-Length") or 0)
+        except Exception:
+            clen = 0
+        if clen > _STREAM_JSON_THRESHOLD:
+            # use_float=True keeps numbers as float — ijson's default
+            # Decimal would blow up json/orjson serialization later.
+            # No get_json retry here: a mid-parse failure has already
+            # consumed the WSGI stream, so a re-read can't recover.
+            return {k: v for k, v in ijson.kvitems(request.stream, "", use_float=True)}
+    return request.get_json(force=True) or {}
+
 # ---- attachments helper (JSON -> [(filename, bytes), ...]) ----
-def _parse_attachments_from_json(data: dict) -> List[Tuple[str, bytes]]:
+def _decode_b64_cached(b64: str, cache: Optional[dict]) -> bytes:
+    """Decode base64, reusing the same bytes object when the identical
+    payload shows up again (same PDF attached for several lenders)."""
+    if cache is None:
+        return base64.b64decode(b64)
+    key = (len(b64), hash(b64))
+    raw = cache.get(key)
+    if raw is None:
+        raw = base64.b64decode(b64)
+        cache[key] = raw
+    return raw
+
+def _parse_attachments_from_json(data: dict, b64_cache: Optional[dict] = None) -> List[Tuple[str, bytes]]:
     out: List[Tuple[str, bytes]] = []
     try:
         items = (data or {}).get("attachments") or []
@@ -1151,7 +1334,7 @@ def _parse_attachments_from_json(data: dict) -> List[Tuple[str, bytes]]:
                 except Exception:
                     pass
             try:
-                raw = base64.b64decode(b64)
+                raw = _decode_b64_cached(b64, b64_cache)
                 out.append((name, raw))
             except Exception:
                 continue
@@ -1161,7 +1344,7 @@ def _parse_attachments_from_json(data: dict) -> List[Tuple[str, bytes]]:
 
 
 # ---- per-lender attachments: accepts dict or list ----
-def _parse_per_lender_attachments_from_json(data: dict) -> Dict[str, List[Tuple[str, bytes]]]:
+def _parse_per_lender_attachments_from_json(data: dict, b64_cache: Optional[dict] = None) -> Dict[str, List[Tuple[str, bytes]]]:
     """
     Accepts either:
       "per_lender_attachments": {
@@ -1192,7 +1375,7 @@ def _parse_per_lender_attachments_from_json(data: dict) -> Dict[str, List[Tuple[
                 except Exception:
                     pass
             try:
-                raw = base64.b64decode(b64)
+                raw = _decode_b64_cached(b64, b64_cache)
                 files.append((name, raw))
             except Exception:
                 continue
@@ -1241,38 +1424,47 @@ def _parse_emails_csv_bytes(raw: bytes) -> dict:
     Returns mapping:
       { lender_lower: { "to": [..], "cc": [..] } }
     """
-    book = {}
     text = raw.decode("utf-8", errors="ignore")
-    reader = csv.DictReader(io.StringIO(text))
-    if not reader.fieldnames:
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if not header:
         return {}
 
-    # normalize header access
-    headers = { (h or "").strip().lower(): h for h in reader.fieldnames }
-    def _get(row, key):
-        return (row.get(headers.get(key, key), "") or "").strip()
-
-    def _split_emails(s):
-        parts = re.split(r"[;,]", s or "")
-        return [p.strip() for p in parts if p.strip()]
+    # resolve column positions once; csv.reader rows are plain lists,
+    # which skips DictReader's per-row dict build
+    cols = [(h or "").strip().lower() for h in header]
+    def _idx(name: str) -> int:
+        try: return cols.index(name)
+        except ValueError: return -1
+    lender_idx, to_idx, cc_idx = _idx("lender"), _idx("to"), _idx("cc")
+    if lender_idx < 0:
+        return {}
 
+    split = _SPLIT_EMAILS_RE.split
+    book = {}
     for row in reader:
-        lender = _get(row, "lender")
+        lender = (row[lender_idx] or "").strip() if lender_idx < len(row) else ""
         if not lender:
             continue
-        to_list = _split_emails(_get(row, "to"))
-        cc_list = _split_emails(_get(row, "cc"))
-        book[lender.strip().lower()] = {"to": to_list, "cc": cc_list}
+        to_s = row[to_idx] if 0 <= to_idx < len(row) else ""
+        cc_s = row[cc_idx] if 0 <= cc_idx < len(row) else ""
+        to_list = [p for p in (x.strip() for x in split(to_s)) if p]
+        cc_list = [p for p in (x.strip() for x in split(cc_s)) if p]
+        book[lender.lower()] = {"to": to_list, "cc": cc_list}
     return book
 
+@functools.lru_cache(maxsize=128)
+def _load_emails_book_cached(path_str: str, mtime_ns: int) -> dict:
+    # mtime_ns in the key means edits/re-uploads invalidate automatically.
+    return _parse_emails_csv_bytes(Path(path_str).read_bytes())
+
 def _load_emails_book(email: str) -> tuple[dict, int]:
-    p = _emails_csv_path(email)
-    if not p.exists():
+    p = _user_emails_csv_path(email)
+    if p is None or not p.exists():
         return {}, 0
-    raw = p.read_bytes()
-    book = _parse_emails_csv_bytes(raw)
-    ts = int(p.stat().st_mtime)
-    return book, ts
+    st = p.stat()
+    book = _load_emails_book_cached(str(p), st.st_mtime_ns)
+    return book, int(st.st_mtime)
 
 def _dedupe_emails(lst):
     seen = set()
@@ -1322,8 +1514,10 @@ def resolve_recipients_user_csv_first(lender_name: str, user_cc: list[str]):
 def _user_email() -> str:
     return (session.get("google_email") or session.get("user_email") or "").strip().lower()
 
+_SAFE_FNAME_RE = re.compile(r"[^a-z0-9_.-]+")
+
 def _safe_email_to_fname(email: str) -> str:
-    return re.sub(r"[^a-z0-9_.-]+", "_", (email or "").lower())
+    return _SAFE_FNAME_RE.sub("_", (email or "").lower())
 
 def _user_emails_csv_path(user: Optional[str] = None) -> Optional[Path]:
     user = (user or _user_email() or "").strip().lower()
@@ -1402,7 +1596,7 @@ LENDER_ALIASES = {"lender","lender name","name","business","company","funder","p
 TO_ALIASES     = {"to","email","primary","primary_email"}
 
 def _split_emails(s: str):
-    return [e.strip() for e in re.split(r"[;,]", s or "") if e.strip()]
+    return [e.strip() for e in _SPLIT_EMAILS_RE.split(s or "") if e.strip()]
 
 def _preview_emails_csv_text(text: str):
     """
@@ -1420,26 +1614,25 @@ def _preview_emails_csv_text(text: str):
     if not lines:
         return 0, []
 
-    reader = csv.DictReader(lines)
-    if not reader.fieldnames:
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
         return 0, []
 
-    fields = [(c or "").strip().lower().lstrip("\ufeff") for c in reader.fieldnames]
-
-    def col_val(row, aliases):
-        r = { (k or "").strip().lower(): (v or "").strip() for k,v in (row or {}).items() }
-        for a in aliases:
-            if a in r and r[a]:
-                return r[a]
-        return ""
+    # resolve alias -> column index once instead of rebuilding a
+    # normalized dict for every row
+    fields = [(c or "").strip().lower().lstrip("\ufeff") for c in header]
+    name_idx = next((i for i, c in enumerate(fields) if c in LENDER_ALIASES), -1)
+    to_idx   = next((i for i, c in enumerate(fields) if c in TO_ALIASES), -1)
+    if name_idx < 0 or to_idx < 0:
+        return 0, []
 
     count = 0
     sample = []
     for row in reader:
-        name = col_val(row, LENDER_ALIASES)
-        to_s = col_val(row, TO_ALIASES)
-        to_list = _split_emails(to_s)
-        if name and to_list:
+        name = (row[name_idx] or "").strip() if name_idx < len(row) else ""
+        to_s = (row[to_idx] or "").strip() if to_idx < len(row) else ""
+        if name and _split_emails(to_s):
             count += 1
             if len(sample) < 6:
                 sample.append(name)
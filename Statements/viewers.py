@@ -1,16 +1,43 @@
 # viewers.py  (Python 3.9 compatible)
+import asyncio
+import functools
 import os
 import io
+import tempfile
+import time
 import uuid
+import zlib
 import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, Iterable
+from typing import NamedTuple, Optional
+from urllib.parse import quote
 
 from fastapi import FastAPI, Request, HTTPException, Depends, Query, File, UploadFile, Form
-from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, FileResponse, Response
+from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
 from supabase import create_client, Client
+try:
+    from supabase import create_async_client, AsyncClient  # supabase-py >= 2.5
+except Exception:
+    create_async_client = None
+    AsyncClient = Client
 from pikepdf import Pdf
+try:
+    from pikepdf import NameTree  # pikepdf >= 3
+except Exception:
+    NameTree = None
 import aiofiles
+import httpx
+
+# orjson serializes large /track payloads several times faster than the
+# stdlib encoder; fall back to JSONResponse when it is not installed.
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as _JSONResponse
+except Exception:
+    _JSONResponse = JSONResponse
 
 # Import your wrapper creator (same folder)
 from wrappers import issue_wrapper_user_branded
@@ -36,19 +63,80 @@ WRAPPER_STORAGE_DIR: str = os.environ.get(
 DEV_MODE = os.getenv("DEV_MODE", "1") == "1"  # set DEV_MODE=0 in prod
 DEV_FAKE_USER_ID = os.getenv("DEV_FAKE_USER_ID")  # optional override to satisfy FK quickly
 
-app = FastAPI(title="Secure Document Portal")
+class _Config(NamedTuple):
+    dev_mode: bool
+    dev_fake_user_id: Optional[str]
+    wrapper_storage_dir: str
+    supabase_url: Optional[str]
+    supabase_service_role: Optional[str]
+
+# Config is read from the environment exactly once and frozen; handlers
+# bind off this tuple rather than re-touching module globals in hot code.
+CFG = _Config(
+    dev_mode=DEV_MODE,
+    dev_fake_user_id=DEV_FAKE_USER_ID,
+    wrapper_storage_dir=WRAPPER_STORAGE_DIR,
+    supabase_url=SUPABASE_URL,
+    supabase_service_role=SUPABASE_SERVICE_ROLE,
+)
+
+app = FastAPI(title="Secure Document Portal", default_response_class=_JSONResponse)
 
-# Lazy-initialized Supabase client
-_sb: Optional[Client] = None
-def supabase() -> Client:
+# Pages render through compiled Jinja2 templates (autoescaped, so user
+# supplied names can no longer break out of the HTML) instead of building
+# f-strings per request.
+templates = Jinja2Templates(directory=str(Path(__file__).resolve().parent / "templates"))
+
+# pikepdf extraction and wrapper creation are CPU-bound (parse + deflate)
+# and would otherwise stall the event loop; they run in worker processes.
+try:
+    EXEC: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(max_workers=2)
+except Exception:
+    EXEC = None  # restricted environments: fall back to inline calls
+
+# Supabase client: async, built once at startup with a pooled keep-alive
+# HTTP session, so PostgREST round-trips await on the event loop instead
+# of tying up threads.
+_sb: Optional[AsyncClient] = None
+
+async def _make_supabase_client() -> AsyncClient:
+    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
+        raise HTTPException(
+            status_code=500,
+            detail="Supabase env vars missing: set SUPABASE_URL and SUPABASE_SERVICE_ROLE"
+        )
+    if create_async_client is None:
+        raise HTTPException(
+            status_code=500,
+            detail="supabase-py is too old for the async client; upgrade to >= 2.5"
+        )
+    client = await create_async_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
+    try:
+        # Rebuild the PostgREST session with explicit connection limits and
+        # timeouts, keeping its base_url/headers intact.
+        old = client.postgrest.session
+        client.postgrest.session = httpx.AsyncClient(
+            base_url=old.base_url,
+            headers=old.headers,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=httpx.Timeout(5.0, connect=2.0),
+        )
+    except Exception:
+        pass  # keep the stock session if postgrest internals change
+    return client
+
+@app.on_event("startup")
+async def _init_supabase() -> None:
+    global _sb
+    try:
+        _sb = await _make_supabase_client()
+    except Exception:
+        _sb = None  # env missing: endpoints will surface the 500 via supabase()
+
+async def supabase() -> AsyncClient:
     global _sb
     if _sb is None:
-        if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
-            raise HTTPException(
-                status_code=500,
-                detail="Supabase env vars missing: set SUPABASE_URL and SUPABASE_SERVICE_ROLE"
-            )
-        _sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
+        _sb = await _make_supabase_client()
     return _sb
 
 # ---------------- Auth Helpers ----------------
@@ -62,94 +150,198 @@ async def get_relaxed_email(request: Request, as_param: Optional[str] = Query(de
     email = request.headers.get("X-User-Email") or as_param
     if email:
         return email.lower()
-    if DEV_MODE:
+    if CFG.dev_mode:
         return "dev@example.com"
     raise HTTPException(status_code=401, detail="Login required")
 
 # ---------------- DB Helpers ----------------
-def _lookup_doc(tracking_id: str) -> dict:
-    res = supabase().table("doc_tracking").select("*").eq("tracking_id", tracking_id).limit(1).execute()
-    rows = getattr(res, "data", None) or []
-    if not rows:
+# Tracking rows and allowlists change rarely, so a short TTL cache takes
+# the Supabase round-trip off the steady-state /v, /file and /download
+# paths. Values are (expires_at, payload).
+_CACHE_TTL = 60.0
+_CACHE_MAX = 10_000
+_DOC_CACHE: dict = {}
+_ALLOW_CACHE: dict = {}
+_CACHE_MISS = object()
+
+def _cache_get(cache: dict, key):
+    hit = cache.get(key)
+    if hit is not None:
+        if hit[0] > time.monotonic():
+            return hit[1]
+        cache.pop(key, None)
+    return _CACHE_MISS
+
+def _cache_put(cache: dict, key, value) -> None:
+    if len(cache) >= _CACHE_MAX:
+        cache.clear()  # crude bound; entries are cheap to refill
+    cache[key] = (time.monotonic() + _CACHE_TTL, value)
+
+# The only columns the routes touch; select("*") was shipping the whole
+# row (timestamps, email body, etc.) on every hit.
+_DOC_COLUMNS = "tracking_id,deal_id,business_name,wrapper_filename"
+
+async def _lookup_doc(tracking_id: str) -> dict:
+    tr = _cache_get(_DOC_CACHE, tracking_id)
+    if tr is not _CACHE_MISS:
+        return tr
+    sb = await supabase()
+    res = await (
+        sb.table("doc_tracking")
+        .select(_DOC_COLUMNS)
+        .eq("tracking_id", tracking_id)
+        .maybe_single()
+        .execute()
+    )
+    row = getattr(res, "data", None)
+    if not row:
         raise HTTPException(status_code=404, detail="Document not found")
-    return rows[0]
+    _cache_put(_DOC_CACHE, tracking_id, row)
+    return row
 
-def _is_email_allowed_for_deal(email: str, deal_id: int) -> bool:
+async def _is_email_allowed_for_deal(email: str, deal_id: int) -> bool:
     # In dev, bypass allowlist to avoid writes to non-updatable views
-    if DEV_MODE:
+    if CFG.dev_mode:
         return True
-    res = supabase().table("deal_allowed_emails").select("email").eq("deal_id", deal_id).execute()
-    rows = getattr(res, "data", None) or []
-    allowed = {r["email"].lower() for r in rows}
-    return email.lower() in allowed
+    key = (deal_id, email.lower())
+    hit = _cache_get(_ALLOW_CACHE, key)
+    if hit is not _CACHE_MISS:
+        return hit
+    # Membership test runs server-side; no need to pull the whole
+    # allowlist over just to probe one address.
+    sb = await supabase()
+    res = await (
+        sb.table("deal_allowed_emails")
+        .select("email")
+        .eq("deal_id", deal_id)
+        .eq("email", email.lower())
+        .limit(1)
+        .execute()
+    )
+    allowed = bool(getattr(res, "data", None))
+    _cache_put(_ALLOW_CACHE, key, allowed)
+    return allowed
 
-def _ensure_user_id_for_email(sb: Client, email: str, prefer_user_id: Optional[str] = None) -> str:
+async def _ensure_user_id_for_email(sb: AsyncClient, email: str, prefer_user_id: Optional[str] = None) -> str:
     """
     Ensure we have a users.id that satisfies doc_tracking.user_id FK.
 
     Order of resolution (dev-friendly):
       1) If caller provided a user_id (query/env), trust it.
-      2) Lookup users by email.
-      3) Try to INSERT a minimal row (several payload shapes, in case of NOT NULLs).
-      4) Fallback to any existing users.id.
-      5) If DEV_FAKE_USER_ID env set, use that.
-      6) Fail with clear message.
+      2) Upsert a minimal row keyed on email (fetch the id on conflict).
+      3) Fallback to any existing users.id.
+      4) If DEV_FAKE_USER_ID env set, use that.
+      5) Fail with clear message.
     """
     # 1) Explicit override
     if prefer_user_id:
         return prefer_user_id
 
-    # 2) Lookup by email
+    # 2) Insert-or-skip in one round-trip. ignore_duplicates keeps an
+    #    existing row's id intact; when the upsert is a no-op we fetch the
+    #    id the conflict pointed at.
     try:
-        res = sb.table("users").select("id").eq("email", email).limit(1).execute()
+        new_id = str(uuid.uuid4())
+        res = await sb.table("users").upsert(
+            {"id": new_id, "email": email},
+            on_conflict="email",
+            ignore_duplicates=True,
+        ).execute()
+        rows = getattr(res, "data", None) or []
+        if rows and rows[0].get("id"):
+            return rows[0]["id"]
+        res = await sb.table("users").select("id").eq("email", email).limit(1).execute()
         rows = getattr(res, "data", None) or []
         if rows:
             return rows[0]["id"]
     except Exception:
         pass
 
-    # 3) Try inserts with different payloads
-    new_id = str(uuid.uuid4())
-    candidates = [
-        {"id": new_id, "email": email},  # simplest
-        {"id": new_id, "email": email, "name": "Sandbox User"},
-        {"id": new_id, "email": email, "full_name": "Sandbox User"},
-        {"id": new_id, "email": email, "created_at": "now()"},
-    ]
-    for payload in candidates:
-        try:
-            sb.table("users").insert(payload).execute()
-            return new_id
-        except Exception:
-            continue
-
-    # 4) Fallback: any existing user
+    # 3) Fallback: any existing user
     try:
-        any_res = sb.table("users").select("id").limit(1).execute()
+        any_res = await sb.table("users").select("id").limit(1).execute()
         any_rows = getattr(any_res, "data", None) or []
         if any_rows:
             return any_rows[0]["id"]
     except Exception:
         pass
 
-    # 5) DEV override
-    if DEV_MODE and DEV_FAKE_USER_ID:
-        return DEV_FAKE_USER_ID
+    # 4) DEV override
+    if CFG.dev_mode and CFG.dev_fake_user_id:
+        return CFG.dev_fake_user_id
 
-    # 6) Give a clear error
+    # 5) Give a clear error
     raise HTTPException(
         status_code=500,
         detail="Sandbox needs a valid users.id. Either create a user row (id,email), "
                "set DEV_FAKE_USER_ID, or pass ?user_id=<existing-users.id>."
     )
 
-async def _stream_file(path: str) -> Iterable[bytes]:
-    async with aiofiles.open(path, "rb") as f:
-        while True:
-            chunk = await f.read(1024 * 1024)
-            if not chunk:
-                break
-            yield chunk
+WRAPPER_ROOT = Path(WRAPPER_STORAGE_DIR).resolve()
+
+@functools.lru_cache(maxsize=4096)
+def _wrapper_path_checked(name: str) -> str:
+    """Resolve a wrapper filename under WRAPPER_ROOT and confirm it exists.
+
+    Wrappers are immutable once issued, so positive results are safe to
+    cache (lru_cache does not memoize the raised 404s). Also refuses
+    names that escape the storage directory.
+    """
+    path = (WRAPPER_ROOT / name).resolve()
+    if WRAPPER_ROOT not in path.parents:
+        raise HTTPException(status_code=404, detail="Wrapper file missing")
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Wrapper file missing")
+    return str(path)
+
+def _cached_original_path(wrapper_path: str) -> str:
+    return wrapper_path + ".orig.pdf"
+
+# One translate() pass replaces every character that breaks filenames or
+# Content-Disposition parsing (separators, wildcards, quotes, newlines).
+_FNAME_TRANS = str.maketrans({c: "_" for c in ' /\\:*?"<>|\r\n\t'})
+
+@functools.lru_cache(maxsize=4096)
+def _filenames_for(tracking_id: str, business_name: Optional[str]):
+    """Download filenames for a tracking row: (wrapper, original)."""
+    stem = (business_name or "Business").translate(_FNAME_TRANS)
+    return (f"{stem}_Documents.pdf", f"{stem}_Statements.pdf")
+
+def _content_disposition(fname: str) -> str:
+    # Non-ASCII names (accented business names) go out RFC 5987 encoded;
+    # the plain form would be mangled or rejected by some browsers.
+    if fname.isascii():
+        return f'attachment; filename="{fname}"'
+    return "attachment; filename*=UTF-8''" + quote(fname)
+
+# Wrapper bytes are immutable, so browsers may keep them for an hour and
+# revalidate with If-None-Match after that.
+_WRAPPER_CACHE_CONTROL = "private, max-age=3600, immutable"
+
+def _wrapper_file_response(path: str, request: Request, filename: Optional[str] = None):
+    st = os.stat(path)
+    etag = f'"{st.st_size:x}-{int(st.st_mtime):x}"'
+    headers = {"ETag": etag, "Cache-Control": _WRAPPER_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/pdf", filename=filename, headers=headers)
+
+def _embedded_file_bytes(fs) -> bytes:
+    """Materialize one embedded file. Goes through the raw (still
+    compressed) stream buffer and inflates the common /FlateDecode case
+    with plain zlib, skipping qpdf's decode-into-extra-copy path; any
+    other filter falls back to read_bytes()."""
+    ef = fs["/EF"]["/F"]
+    try:
+        filt = ef.get("/Filter", None)
+        raw = bytes(ef.read_raw_bytes())
+        if filt is None:
+            return raw
+        if str(filt) == "/FlateDecode":
+            return zlib.decompress(raw)
+    except Exception:
+        pass
+    return bytes(ef.read_bytes())
 
 def _extract_first_pdf_attachment(wrapper_path: str) -> bytes:
     """
@@ -160,45 +352,166 @@ def _extract_first_pdf_attachment(wrapper_path: str) -> bytes:
         names = pdf.Root.get("/Names")
         if not names or "/EmbeddedFiles" not in names:
             raise HTTPException(status_code=400, detail="Wrapper has no embedded original")
-        ef = names["/EmbeddedFiles"]["/Names"]
-        chosen = None
-        for i in range(0, len(ef), 2):
-            fname = str(ef[i])
-            fs = ef[i + 1]
-            data = bytes(fs["/EF"]["/F"].read_bytes())
-            if fname.lower().endswith(".pdf"):
-                return data
-            if chosen is None:
-                chosen = data
-        if chosen is None:
+        chosen_fs = None
+        if NameTree is not None:
+            # NameTree iterates lazily (and follows /Kids subtrees the flat
+            # walk below would miss); we stop at the first .pdf hit
+            entries = NameTree(names["/EmbeddedFiles"]).items()
+            for fname, fs in entries:
+                if str(fname).lower().endswith(".pdf"):
+                    return _embedded_file_bytes(fs)
+                if chosen_fs is None:
+                    chosen_fs = fs
+        else:
+            ef = names["/EmbeddedFiles"]["/Names"]
+            for i in range(0, len(ef), 2):
+                fname = str(ef[i])
+                fs = ef[i + 1]
+                if fname.lower().endswith(".pdf"):
+                    return _embedded_file_bytes(fs)
+                if chosen_fs is None:
+                    chosen_fs = fs
+        if chosen_fs is None:
             raise HTTPException(status_code=400, detail="No embedded files found")
-        return chosen
+        return _embedded_file_bytes(chosen_fs)
 
-def _log_view(tr: dict, email: str, req: Request) -> None:
-    supabase().table("doc_view_log").insert({
-        "tracking_id": tr["tracking_id"],
-        "deal_id": tr["deal_id"],
-        "business_name": tr.get("business_name"),
-        "email": email,
-        "ip": req.client.host if req.client else None,
-        "user_agent": req.headers.get("user-agent"),
-    }).execute()
+def _extract_job(wrapper_path: str) -> bytes:
+    """Process-pool shim: HTTPException may not survive pickling back to
+    the parent, so it travels as "<status>:<detail>" in a RuntimeError."""
+    try:
+        return _extract_first_pdf_attachment(wrapper_path)
+    except HTTPException as e:
+        raise RuntimeError(f"{e.status_code}:{e.detail}")
 
-def _log_download(tr: dict, email: str, req: Request) -> None:
-    supabase().table("doc_download_log").insert({
+async def _extract_original_async(wrapper_path: str) -> bytes:
+    if EXEC is None:
+        return _extract_first_pdf_attachment(wrapper_path)
+    loop = asyncio.get_event_loop()
+    try:
+        return await loop.run_in_executor(EXEC, _extract_job, wrapper_path)
+    except RuntimeError as e:
+        code, _, detail = str(e).partition(":")
+        if code.isdigit():
+            raise HTTPException(status_code=int(code), detail=detail)
+        raise
+
+# Audit rows are append-only and nobody reads them on the request path, so
+# they go through an in-process queue and a background task that flushes
+# them in multi-row inserts (PostgREST accepts a list payload).
+_LOG_QUEUE: Optional["asyncio.Queue"] = None
+_LOG_FLUSH_MAX = 100
+_LOG_FLUSH_SECS = 0.5
+
+@app.on_event("startup")
+async def _start_log_writer() -> None:
+    global _LOG_QUEUE
+    _LOG_QUEUE = asyncio.Queue()
+    asyncio.get_event_loop().create_task(_drain_logs(_LOG_QUEUE))
+
+async def _drain_logs(queue: "asyncio.Queue") -> None:
+    while True:
+        table, row = await queue.get()
+        batches = {table: [row]}
+        deadline = time.monotonic() + _LOG_FLUSH_SECS
+        count = 1
+        while count < _LOG_FLUSH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                table, row = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batches.setdefault(table, []).append(row)
+            count += 1
+        for table, rows in batches.items():
+            try:
+                sb = await supabase()
+                await sb.table(table).insert(rows).execute()
+            except Exception:
+                pass  # audit writes must never take the viewer down
+
+def _log_row(tr: dict, email: str, req: Request) -> dict:
+    return {
         "tracking_id": tr["tracking_id"],
         "deal_id": tr["deal_id"],
         "business_name": tr.get("business_name"),
         "email": email,
         "ip": req.client.host if req.client else None,
         "user_agent": req.headers.get("user-agent"),
-    }).execute()
+    }
+
+async def _enqueue_log(table: str, row: dict) -> None:
+    if _LOG_QUEUE is not None:
+        try:
+            _LOG_QUEUE.put_nowait((table, row))
+            return
+        except Exception:
+            pass
+    # queue not up yet (e.g. before startup in tests): write inline
+    sb = await supabase()
+    await sb.table(table).insert(row).execute()
+
+async def _log_view(tr: dict, email: str, req: Request) -> None:
+    await _enqueue_log("doc_view_log", _log_row(tr, email, req))
+
+async def _log_download(tr: dict, email: str, req: Request) -> None:
+    await _enqueue_log("doc_download_log", _log_row(tr, email, req))
+
+async def _fetch_doc_checked(tracking_id: str, email: str, req: Request, log_table: Optional[str]) -> dict:
+    """
+    Resolve a tracking row, enforce the allowlist and (optionally) write the
+    audit row in ONE PostgREST round-trip via the view_document RPC:
+
+        create function view_document(
+            p_tracking_id text, p_email text, p_ip text, p_ua text,
+            p_log_table text default null
+        ) returns doc_tracking ... ;
+        -- raises sqlstate 'PT404' when the row is missing and
+        -- 'PT403' when the email is not allowed for the deal.
+
+    Falls back to the separate lookup/allowlist/log helpers when the RPC
+    is not deployed, so both paths stay deployable.
+    """
+    try:
+        sb = await supabase()
+        res = await sb.rpc("view_document", {
+            "p_tracking_id": tracking_id,
+            "p_email": email.lower(),
+            "p_ip": req.client.host if req.client else None,
+            "p_ua": req.headers.get("user-agent"),
+            "p_log_table": log_table,
+        }).execute()
+        data = getattr(res, "data", None)
+        if isinstance(data, list):
+            data = data[0] if data else None
+        if data:
+            return data
+        raise HTTPException(status_code=404, detail="Document not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        msg = str(e)
+        if "PT404" in msg:
+            raise HTTPException(status_code=404, detail="Document not found")
+        if "PT403" in msg:
+            raise HTTPException(status_code=403, detail="Not authorized for this deal")
+        # RPC missing or transient failure: take the multi-call path
+
+    tr = await _lookup_doc(tracking_id)
+    if not await _is_email_allowed_for_deal(email, tr["deal_id"]):
+        raise HTTPException(status_code=403, detail="Not authorized for this deal")
+    if log_table == "doc_view_log":
+        await _log_view(tr, email, req)
+    elif log_table == "doc_download_log":
+        await _log_download(tr, email, req)
+    return tr
 
 # ---------------- Routes ----------------
 
 @app.get("/health")
 def health():
-    return {"ok": True, "dev_mode": DEV_MODE, "storage": WRAPPER_STORAGE_DIR}
+    return {"ok": True, "dev_mode": CFG.dev_mode, "storage": CFG.wrapper_storage_dir}
 
 @app.get("/v/{tracking_id}", response_class=HTMLResponse)
 async def view_page(
@@ -206,22 +519,14 @@ async def view_page(
     request: Request,
     user_email: str = Depends(get_relaxed_email),
 ):
-    tr = _lookup_doc(tracking_id)
-    if not _is_email_allowed_for_deal(user_email, tr["deal_id"]):
-        raise HTTPException(status_code=403, detail="Not authorized for this deal")
-    biz = tr.get("business_name") or "Business"
-    return f"""<!doctype html>
-<html><head><meta charset="utf-8"><title>{biz} — Documents</title></head>
-<body style="margin:0;background:#0b0b0c">
-  <div style="display:flex;gap:10px;align-items:center;padding:10px;background:#111;color:#eee;font-family:system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif;">
-    <div style="font-weight:600">Deal: {tr["deal_id"]}</div>
-    <div>Recipient: {user_email}</div>
-    <div style="margin-left:auto"></div>
-    <a href="/download/{tracking_id}?as={user_email}" style="background:#2563eb;color:#fff;padding:6px 12px;border-radius:8px;text-decoration:none">Download original</a>
-    <a href="/download/{tracking_id}?what=wrapper&as={user_email}" style="background:#374151;color:#fff;padding:6px 12px;border-radius:8px;text-decoration:none;margin-left:8px">Download wrapper</a>
-  </div>
-  <iframe src="/file/{tracking_id}?as={user_email}" style="width:100%;height:calc(100vh - 48px);border:0;background:#1a1a1b"></iframe>
-</body></html>"""
+    tr = await _fetch_doc_checked(tracking_id, user_email, request, log_table=None)
+    return templates.TemplateResponse("view.html", {
+        "request": request,
+        "biz": tr.get("business_name") or "Business",
+        "deal_id": tr["deal_id"],
+        "tracking_id": tracking_id,
+        "user_email": user_email,
+    })
 
 @app.get("/file/{tracking_id}")
 async def file_inline(
@@ -229,14 +534,13 @@ async def file_inline(
     request: Request,
     user_email: str = Depends(get_relaxed_email),
 ):
-    tr = _lookup_doc(tracking_id)
-    if not _is_email_allowed_for_deal(user_email, tr["deal_id"]):
-        raise HTTPException(status_code=403, detail="Not authorized for this deal")
-    _log_view(tr, user_email, request)
-    wrapper_path = os.path.join(WRAPPER_STORAGE_DIR, tr["wrapper_filename"])
-    if not os.path.exists(wrapper_path):
-        raise HTTPException(status_code=404, detail="Wrapper file missing")
-    return StreamingResponse(_stream_file(wrapper_path), media_type="application/pdf")
+    tr = await _fetch_doc_checked(tracking_id, user_email, request, log_table="doc_view_log")
+    wrapper_path = _wrapper_path_checked(tr["wrapper_filename"])
+    # FileResponse lets Starlette use os.sendfile instead of pumping
+    # 1 MiB chunks through the aiofiles thread pool, and honours Range /
+    # If-Range so the browser's PDF viewer can fetch pages piecemeal
+    # instead of pulling the whole wrapper before rendering page one.
+    return _wrapper_file_response(wrapper_path, request)
 
 @app.get("/download/{tracking_id}")
 async def download(
@@ -245,94 +549,62 @@ async def download(
     user_email: str = Depends(get_relaxed_email),
     what: str = Query(default="original", regex="^(original|wrapper)$"),
 ):
-    tr = _lookup_doc(tracking_id)
-    if not _is_email_allowed_for_deal(user_email, tr["deal_id"]):
-        raise HTTPException(status_code=403, detail="Not authorized for this deal")
-
-    wrapper_path = os.path.join(WRAPPER_STORAGE_DIR, tr["wrapper_filename"])
-    if not os.path.exists(wrapper_path):
-        raise HTTPException(status_code=404, detail="Wrapper file missing")
-
-    _log_download(tr, user_email, request)
+    tr = await _fetch_doc_checked(tracking_id, user_email, request, log_table="doc_download_log")
+    wrapper_path = _wrapper_path_checked(tr["wrapper_filename"])
 
+    wrapper_fname, original_fname = _filenames_for(tracking_id, tr.get("business_name"))
     if what == "wrapper":
-        fname = f'{(tr.get("business_name") or "Business").replace(" ","_")}_Documents.pdf'
-        return StreamingResponse(
-            _stream_file(wrapper_path),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f'attachment; filename="{fname}"'}
-        )
+        return _wrapper_file_response(wrapper_path, request, filename=wrapper_fname)
 
     # what == original
-    original_bytes = _extract_first_pdf_attachment(wrapper_path)
-    fname = f'{(tr.get("business_name") or "Business").replace(" ","_")}_Statements.pdf'
+    fname = original_fname
+
+    # Wrappers are immutable once issued, so the extracted original is
+    # cached next to the wrapper and served from disk on repeat hits.
+    cache_path = _cached_original_path(wrapper_path)
+    try:
+        if os.path.exists(cache_path) and os.stat(cache_path).st_mtime >= os.stat(wrapper_path).st_mtime:
+            return FileResponse(cache_path, media_type="application/pdf", filename=fname)
+    except OSError:
+        pass
+
+    original_bytes = await _extract_original_async(wrapper_path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".", suffix=".orig.tmp")
+        with os.fdopen(fd, "wb") as out:
+            out.write(original_bytes)
+        os.replace(tmp_path, cache_path)  # atomic publish
+        return FileResponse(cache_path, media_type="application/pdf", filename=fname)
+    except OSError:
+        pass  # cache dir not writable: stream straight from memory
+
     return StreamingResponse(
         io.BytesIO(original_bytes),
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{fname}"'}
+        headers={"Content-Disposition": _content_disposition(fname)}
     )
 
 @app.get("/track")
-def track_json(deal_id: Optional[int] = Query(default=None), limit: int = 200):
-    q = supabase().table("v_doc_status").select("*").order("issued_at", desc=True).limit(limit)
+async def track_json(deal_id: Optional[int] = Query(default=None), limit: int = 200):
+    sb = await supabase()
+    q = sb.table("v_doc_status").select("*").order("issued_at", desc=True).limit(limit)
     if deal_id is not None:
         q = q.eq("deal_id", deal_id)
-    rows = q.execute().data or []
+    rows = (await q.execute()).data or []
     return {"items": rows, "count": len(rows)}
 
 # ---------------- Sandbox: wrap & preview (no emails) ----------------
 
 @app.get("/sandbox", response_class=HTMLResponse)
 async def sandbox_page(
+    request: Request,
     user_email: str = Depends(get_relaxed_email),
     user_id: Optional[str] = Query(default=None),
 ):
-    return f"""<!doctype html>
-<html><head><meta charset="utf-8"><title>Sandbox Wrap</title></head>
-<body style="font-family:system-ui;padding:24px">
-  <h2>Wrap a PDF (no emails sent)</h2>
-  <p>Using email: <b>{user_email}</b></p>
-  <form id="f" method="post" action="/sandbox/wrap?as={user_email}" enctype="multipart/form-data">
-    <div style="margin:8px 0">
-      <label>PDF file:</label>
-      <input type="file" name="file" accept="application/pdf" required>
-    </div>
-    <div style="margin:8px 0">
-      <label>Funder name:</label>
-      <input type="text" name="funder_name" value="Preview Funder">
-    </div>
-    <div style="margin:8px 0">
-      <label>Deal ID (optional):</label>
-      <input type="number" name="deal_id" min="0" value="0">
-    </div>
-    <div style="margin:8px 0">
-      <label>Optional users.id (to satisfy FK):</label>
-      <input type="text" name="user_id" placeholder="existing users.id UUID">
-    </div>
-    <button type="submit">Wrap & Get Link</button>
-  </form>
-  <pre id="out" style="margin-top:16px;background:#111;color:#fafafa;padding:12px;border-radius:8px;display:none"></pre>
-  <script>
-    const form = document.getElementById('f');
-    const out = document.getElementById('out');
-    form.addEventListener('submit', async (e) => {{
-      e.preventDefault();
-      const fd = new FormData(form);
-      const res = await fetch(form.action, {{ method: 'POST', body: fd }});
-      const js = await res.json();
-      out.style.display = 'block';
-      out.textContent = JSON.stringify(js, null, 2);
-      if (js.view_url) {{
-        const a = document.createElement('a');
-        a.href = js.view_url + '?as={user_email}';
-        a.textContent = 'Open viewer';
-        a.style.display = 'inline-block';
-        a.style.marginTop = '10px';
-        document.body.appendChild(a);
-      }}
-    }});
-  </script>
-</body></html>"""
+    return templates.TemplateResponse("sandbox.html", {
+        "request": request,
+        "user_email": user_email,
+    })
 
 @app.post("/sandbox/wrap")
 async def sandbox_wrap(
@@ -349,7 +621,7 @@ async def sandbox_wrap(
     No emails and no writes to non-updatable views.
     """
     # 1) Ensure storage directory exists
-    Path(WRAPPER_STORAGE_DIR).mkdir(parents=True, exist_ok=True)
+    Path(CFG.wrapper_storage_dir).mkdir(parents=True, exist_ok=True)
 
     # 2) Save upload to a temp path
     tmpdir = Path("/tmp/viewer_sandbox")
@@ -359,51 +631,81 @@ async def sandbox_wrap(
         filename += ".pdf"
     in_path = tmpdir / f"{os.getpid()}_{filename}"
     async with aiofiles.open(in_path, "wb") as f:
+        # 4 MiB chunks: fewer event-loop hops per upload than 1 MiB
         while True:
-            chunk = await file.read(1024 * 1024)
+            chunk = await file.read(4 * 1024 * 1024)
             if not chunk:
                 break
             await f.write(chunk)
-
-    sb = supabase()
-
-    # 3) Resolve a users.id that satisfies FK
-    prefer_user_id = form_user_id or qp_user_id or DEV_FAKE_USER_ID
-    try:
-        user_id = _ensure_user_id_for_email(sb, user_email, prefer_user_id=prefer_user_id)
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"User resolution failed: {e}")
-
-    # 4) Create a sandbox deal row if none provided (writes to a REAL table)
-    if deal_id == 0:
+    # The upload is read back exactly once by the wrapper; tell the kernel
+    # not to keep it in the page cache (Linux only; no-op elsewhere).
+    if hasattr(os, "posix_fadvise"):
         try:
-            dres = sb.table("deals").insert({
-                "application_json": {"business_name": "Sandbox Business", "email": user_email}
-            }).execute()
-            deal_id = dres.data[0]["id"]
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to create sandbox deal: {e}")
-
-    # 5) Call your wrapper
+            fd = os.open(in_path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    sb = await supabase()
+
+    # 3+4) User resolution and the sandbox deal insert hit independent
+    #      tables, so the two round-trips run concurrently.
+    prefer_user_id = form_user_id or qp_user_id or CFG.dev_fake_user_id
+
+    async def _create_deal() -> int:
+        dres = await sb.table("deals").insert({
+            "application_json": {"business_name": "Sandbox Business", "email": user_email}
+        }).execute()
+        return dres.data[0]["id"]
+
+    want_deal = deal_id == 0
+    user_res, deal_res = await asyncio.gather(
+        _ensure_user_id_for_email(sb, user_email, prefer_user_id=prefer_user_id),
+        _create_deal() if want_deal else asyncio.sleep(0),
+        return_exceptions=True,
+    )
+    if isinstance(user_res, HTTPException):
+        raise user_res
+    if isinstance(user_res, Exception):
+        raise HTTPException(status_code=500, detail=f"User resolution failed: {user_res}")
+    user_id = user_res
+    if want_deal:
+        if isinstance(deal_res, Exception):
+            raise HTTPException(status_code=500, detail=f"Failed to create sandbox deal: {deal_res}")
+        deal_id = deal_res
+
+    # 5) Call your wrapper (in a worker process; it parses and re-writes
+    #    the whole PDF and would block the loop for large uploads)
+    wrap_call = functools.partial(
+        issue_wrapper_user_branded,
+        user_id=user_id,
+        deal_id=deal_id,
+        original_pdf_path=str(in_path),
+        funder_name=funder_name,
+        recipient_email=user_email,
+        storage_dir=CFG.wrapper_storage_dir,
+        supabase_url=CFG.supabase_url,
+        supabase_service_key=CFG.supabase_service_role,
+        # the response hands back /v/{tracking_id} links immediately, so
+        # the doc_tracking row must exist before we return
+        await_tracking=True
+    )
     try:
-        result = issue_wrapper_user_branded(
-            user_id=user_id,
-            deal_id=deal_id,
-            original_pdf_path=str(in_path),
-            funder_name=funder_name,
-            recipient_email=user_email,
-            storage_dir=WRAPPER_STORAGE_DIR,
-            supabase_url=SUPABASE_URL,
-            supabase_service_key=SUPABASE_SERVICE_ROLE
-        )
+        if EXEC is None:
+            result = wrap_call()
+        else:
+            result = await asyncio.get_event_loop().run_in_executor(EXEC, wrap_call)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Wrapper failed: {e}")
 
     # 6) Return direct links
     tracking_id = result["tracking_id"]
-    return JSONResponse({
+    _DOC_CACHE.pop(tracking_id, None)
+    _wrapper_path_checked.cache_clear()  # the new wrapper file just landed
+    return _JSONResponse({
         "ok": True,
         "tracking_id": tracking_id,
         "user_id": user_id,
@@ -1,15 +1,38 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import os, json, time, re, base64, requests
+import email.parser
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Dict, List, Tuple
+from typing import Iterable, NamedTuple, Optional, Dict, List, Tuple
 import sqlite3
+try:
+    import orjson  # optional: ~3x faster Gmail payload decoding
+except Exception:
+    orjson = None
+
+def _json_loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
 # ---------- Paths ----------
 BASE_DIR = Path(__file__).resolve().parents[1]           # -> Statements/
 TOKENS_DIR = BASE_DIR / "tokens"
 DB_PATH = Path(os.environ.get("DEALS_DB_PATH", str(BASE_DIR / "deals.db")))
 EMAILS_JSON_PATH = BASE_DIR / "emails.json"              # for lender name mapping (optional)
 
+# Keep-alive session for the OAuth token endpoint; token refreshes from
+# every watcher reuse one TLS connection.
+_TOKEN_SESSION = requests.Session()
+
 # ---------- Tiny token helper (compatible with auth_google.py output) ----------
 def _read_token(email: str) -> dict | None:
     p = TOKENS_DIR / f"{email}.json"
@@ -47,8 +70,9 @@ def _ensure_access_token(td: dict) -> Optional[str]:
     token_uri = td.get("token_uri") or "https://oauth2.googleapis.com/token"
     if not (rt and cid and csec):
         return None
+    prev_token = td.get("token")
     try:
-        r = requests.post(token_uri, data={
+        r = _TOKEN_SESSION.post(token_uri, data={
             "grant_type": "refresh_token",
             "refresh_token": rt,
             "client_id": cid,
@@ -61,65 +85,174 @@ def _ensure_access_token(td: dict) -> Optional[str]:
             return None
         td["token"] = access
         if "expires_in" in js:
-            td["expiry"] = None  # not strictly needed for this loop
-        # persist back to disk
-        p = TOKENS_DIR / f"{td.get('email') or 'account'}.json"
-        try: p.write_text(json.dumps(td, indent=2))
-        except Exception: pass
+            # record the real expiry so the next call doesn't force
+            # another refresh
+            import datetime
+            exp_dt = datetime.datetime.now(datetime.timezone.utc) \
+                + datetime.timedelta(seconds=int(js["expires_in"]))
+            td["expiry"] = exp_dt.isoformat().replace("+00:00", "Z")
+        # persist back to disk only when the token actually changed, via
+        # write-to-temp + rename so a crash can't leave a truncated file
+        if access != prev_token:
+            p = TOKENS_DIR / f"{td.get('email') or 'account'}.json"
+            tmp = p.with_suffix(".json.tmp")
+            try:
+                tmp.write_text(json.dumps(td))
+                os.replace(tmp, p)
+            except Exception:
+                pass
         return access
     except Exception:
         return None
 
+def _expiry_epoch(td: dict) -> float:
+    exp = td.get("expiry")
+    if isinstance(exp, str):
+        try:
+            import datetime
+            return datetime.datetime.fromisoformat(exp.replace("Z", "+00:00")).timestamp()
+        except Exception:
+            pass
+    return time.time() + 300  # unknown expiry: re-check in five minutes
+
 # ---------- Gmail REST ----------
 class Gmail:
     def __init__(self, email: str):
         self.email = email
         self.token_doc = _read_token(email)
+        # One pooled keep-alive session per account: hundreds of API calls
+        # per tick ride a single TLS connection instead of handshaking each.
+        self.s = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=20)
+        self.s.mount("https://", adapter)
+        # Cached (token, expiry) so _hdrs is an integer compare per call
+        # rather than re-parsing the RFC3339 expiry string every request.
+        self._tok: Optional[str] = None
+        self._exp: float = 0.0
 
     def _hdrs(self) -> dict:
+        # gzip: Gmail JSON responses compress ~5x and requests inflates
+        # transparently
+        if self._tok and time.time() < self._exp - 60:
+            return {"Authorization": f"Bearer {self._tok}", "Accept-Encoding": "gzip"}
         tok = _ensure_access_token(self.token_doc or {})
         if not tok:
             raise RuntimeError("No valid Gmail token; reconnect Gmail.")
-        return {"Authorization": f"Bearer {tok}"}
+        self._tok = tok
+        self._exp = _expiry_epoch(self.token_doc or {})
+        return {"Authorization": f"Bearer {tok}", "Accept-Encoding": "gzip"}
 
     def get_message(self, msg_id: str, fmt: str = "metadata", headers: List[str] | None = None) -> dict:
         params = {"format": fmt}
         if headers:
             params["metadataHeaders"] = headers
-        r = requests.get(
+        r = self.s.get(
             f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}",
             headers=self._hdrs(), params=params, timeout=15
         )
         r.raise_for_status()
-        return r.json()
+        return _json_loads(r.content)
 
     def get_thread(self, thread_id: str) -> dict:
-        r = requests.get(
+        r = self.s.get(
             f"https://gmail.googleapis.com/gmail/v1/users/me/threads/{thread_id}",
             headers=self._hdrs(), timeout=15
         )
         r.raise_for_status()
-        return r.json()
+        return _json_loads(r.content)
+
+    def batch_get_messages(self, ids: List[str], fmt: str = "metadata",
+                           headers: List[str] | None = None) -> List[Tuple[str, dict]]:
+        """
+        Fetch many messages in one round trip via the Gmail JSON batch
+        endpoint (multipart/mixed, max 100 sub-requests per POST) instead
+        of one messages.get per id. Returns [(msg_id, payload), ...];
+        failed sub-requests are silently dropped.
+        """
+        out: List[Tuple[str, dict]] = []
+        if not ids:
+            return out
+        qs = f"format={fmt}"
+        if headers:
+            qs += "".join(f"&metadataHeaders={h}" for h in headers)
+        for i in range(0, len(ids), 100):
+            chunk = ids[i:i + 100]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            parts = []
+            for mid in chunk:
+                parts.append(
+                    f"--{boundary}\r\n"
+                    f"Content-Type: application/http\r\n\r\n"
+                    f"GET /gmail/v1/users/me/messages/{mid}?{qs}\r\n\r\n"
+                )
+            body = ("".join(parts) + f"--{boundary}--\r\n").encode()
+            hdrs = self._hdrs()
+            hdrs["Content-Type"] = f"multipart/mixed; boundary={boundary}"
+            r = self.s.post(
+                "https://gmail.googleapis.com/batch/gmail/v1",
+                headers=hdrs, data=body, timeout=30
+            )
+            r.raise_for_status()
+            ctype = r.headers.get("Content-Type", "")
+            parsed = email.parser.BytesParser().parsebytes(
+                b"Content-Type: " + ctype.encode() + b"\r\n\r\n" + r.content
+            )
+            for part in parsed.get_payload():
+                raw = part.get_payload(decode=True)
+                if raw is None:
+                    payload = part.get_payload()
+                    raw = payload.encode() if isinstance(payload, str) else b""
+                # each part is a serialized HTTP response; body follows the
+                # first blank line
+                sep = raw.find(b"\r\n\r\n")
+                if sep < 0:
+                    continue
+                try:
+                    js = _json_loads(raw[sep + 4:])
+                except Exception:
+                    continue
+                mid = js.get("id")
+                if mid:
+                    out.append((mid, js))
+        return out
 
     def search(self, q: str, max_results: int = 50) -> List[str]:
-        r = requests.get(
+        r = self.s.get(
             f"https://gmail.googleapis.com/gmail/v1/users/me/messages",
             headers=self._hdrs(),
             params={"q": q, "maxResults": max_results},
             timeout=15
         )
         r.raise_for_status()
-        js = r.json() or {}
+        js = _json_loads(r.content) or {}
         return [m["id"] for m in js.get("messages", [])]
 
 # ---------- DB ----------
 def db():
-    c = sqlite3.connect(str(DB_PATH))
+    # cached_statements keeps our recurring queries compiled; autocommit
+    # mode (isolation_level=None) leaves transaction boundaries to us.
+    c = sqlite3.connect(str(DB_PATH), cached_statements=256, isolation_level=None)
     c.row_factory = sqlite3.Row
+    # Per-connection tuning: NORMAL sync is safe under WAL and skips an
+    # fsync per commit; busy_timeout keeps concurrent watchers from
+    # failing fast on a locked db.
+    try:
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute("PRAGMA temp_store=MEMORY")
+        c.execute("PRAGMA mmap_size=268435456")
+        c.execute("PRAGMA busy_timeout=5000")
+    except Exception:
+        pass
     return c
 
 def init_db():
     con = db(); cur = con.cursor()
+    # WAL is persistent in the db file; set it once here so readers and
+    # the decision inserts stop serializing against each other.
+    try:
+        cur.execute("PRAGMA journal_mode=WAL")
+    except Exception:
+        pass
     # normalized decisions table (idempotent)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS decisions (
@@ -139,44 +272,90 @@ def init_db():
     """)
     # helpful index
     cur.execute("CREATE INDEX IF NOT EXISTS idx_decisions_deal ON decisions(deal_id)")
+    # deliveries.thread_id lets tick skip the messages.get hop; populated
+    # at send time when the provider returns it (table lives in the main app)
+    try:
+        cols = {r[1] for r in cur.execute("PRAGMA table_info(deliveries)").fetchall()}
+        if cols and "thread_id" not in cols:
+            cur.execute("ALTER TABLE deliveries ADD COLUMN thread_id TEXT")
+    except Exception:
+        pass
     con.commit(); con.close()
 
 # ---------- Helpers ----------
-def _parse_hdr(hdrs: List[dict], name: str) -> str:
-    for h in hdrs or []:
-        if (h.get("name") or "").lower() == name.lower():
-            return h.get("value") or ""
-    return ""
+# Compiled once at import; these fire for every message in a tick and
+# re.IGNORECASE replaces the per-call .lower() copies.
+# The three status tests are fused into one named-group alternation so the
+# text is scanned once instead of up to three times; _classify then picks
+# by group priority (APPROVED > DECLINED > STIPS), not textual position.
+_RE_STATUS = re.compile(
+    r"(?P<A>\b(?:approved|clear to fund|ctf|green light)\b)"
+    r"|(?P<D>\b(?:declined|cannot|won't|pass|not a fit)\b)"
+    r"|(?P<S>\b(?:stips?|need(?:ed)?|please provide|missing|docs|documents|more info)\b)",
+    re.I,
+)
+_RE_AMT      = re.compile(r"\$?([0-9][0-9,]{3,})")
+_RE_FACTOR   = re.compile(r"(factor|buy rate)[^\d]*([1][.]\d{1,2})", re.I)
+
+def _headers_map(hdrs: List[dict]) -> Dict[str, str]:
+    # Build the name->value map once per message; the old per-field linear
+    # scan lower-cased every header name on every lookup.
+    return {(h.get("name") or "").lower(): h.get("value") or "" for h in hdrs or []}
 
 def _extract_email(addr: str) -> str:
-    # "Name <x@y.com>" -> x@y.com
-    m = re.search(r"<([^>]+)>", addr)
-    return (m.group(1) if m else addr).strip().lower()
+    # "Name <x@y.com>" -> x@y.com; plain find/slice beats the regex here
+    if "<" in addr:
+        lt = addr.find("<")
+        gt = addr.find(">", lt)
+        if gt > lt:
+            return addr[lt + 1:gt].strip().lower()
+    return addr.strip().lower()
 
 def _classify(text: str) -> str:
-    t = (text or "").lower()
-    if re.search(r"\b(approved|clear to fund|ctf|green light)\b", t): return "APPROVED"
-    if re.search(r"\b(declined|cannot|won't|pass|not a fit)\b", t):   return "DECLINED"
-    if re.search(r"\b(stips|stip|need(ed)?|please provide|missing|docs|documents|more info)\b", t): return "STIPS_REQUIRED"
+    # Still one scan over the text, but the label comes from the highest-
+    # priority group that fired anywhere, matching the old ordered checks
+    # ("docs are in, approved" must be APPROVED even though "docs" appears
+    # first).
+    hit_d = hit_s = False
+    for m in _RE_STATUS.finditer(text or ""):
+        g = m.lastgroup
+        if g == "A":
+            return "APPROVED"
+        if g == "D":
+            hit_d = True
+        else:
+            hit_s = True
+    if hit_d:
+        return "DECLINED"
+    if hit_s:
+        return "STIPS_REQUIRED"
     return "OTHER"
 
 def _offer_hint(text: str) -> dict:
-    t = (text or "").lower()
+    t = text or ""
     amt = None; factor = None
-    m = re.search(r"\$?([0-9][0-9,]{3,})", t)
+    m = _RE_AMT.search(t)
     if m:
         try: amt = int(m.group(1).replace(",", ""))
         except: pass
-    m = re.search(r"(factor|buy rate)[^\d]*([1][.]\d{1,2})", t)
+    m = _RE_FACTOR.search(t)
     if m:
         factor = float(m.group(2))
     return {"amount": amt, "factor": factor}
 
+_book_cache: dict = {"mtime": 0.0, "map": {}}
+
 def _load_email_book() -> Dict[str, str]:
     """
     Reverse lookup map email -> lender name from emails.json.
+
+    Cached on file mtime so long-running workers pick up edits without
+    re-parsing the file every tick.
     """
     try:
+        st = EMAILS_JSON_PATH.stat()
+        if st.st_mtime == _book_cache["mtime"]:
+            return _book_cache["map"]
         data = json.loads(EMAILS_JSON_PATH.read_text("utf-8"))
         rows = data.get("emails") or []
         out = {}
@@ -185,9 +364,11 @@ def _load_email_book() -> Dict[str, str]:
             ems  = (row or {}).get("email") or (row or {}).get("emails") or ""
             for e in [s.strip().lower() for s in ems.split(",") if s.strip()]:
                 out[e] = name
+        _book_cache["mtime"] = st.st_mtime
+        _book_cache["map"] = out
         return out
     except Exception:
-        return {}
+        return _book_cache["map"]
 
 def row_as_dict(row):
     if row is None:
@@ -201,6 +382,54 @@ def row_as_dict(row):
     except Exception:
         return {}
 
+class _TokenBucket:
+    """Caps Gmail quota-unit spend so the thread-pool fan-out stays under
+    the per-user 250 units/sec limit (search=5, get=5, thread=10)."""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, units: float = 1.0) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= units:
+                    self.tokens -= units
+                    return
+                wait = (units - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Minimum gap between subject-tag searches for the same deal
+_SEARCH_COOLDOWN_SECS = 300.0
+
+class DecisionRow(NamedTuple):
+    """One decisions-table row in column order, so executemany can consume
+    it directly. A NamedTuple is far lighter than the ad-hoc dicts it
+    replaced (no per-instance __dict__) and 3.9-safe, unlike
+    dataclass(slots=True)."""
+    deal_id: int
+    lender: str
+    status: str
+    reason: str
+    offer_json: str
+    stips_json: str
+    provider: str
+    message_id: str
+    thread_id: str
+    snippet: str
+    updated_at: int
+
+_DECISION_INSERT_SQL = """
+    INSERT OR IGNORE INTO decisions
+    (deal_id, lender, status, reason, offer_json, stips_json, provider, message_id, thread_id, snippet, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 # ---------- Watcher ----------
 class GmailWatcher:
     def __init__(self, email: str, db_path: str):
@@ -210,11 +439,25 @@ class GmailWatcher:
         init_db()
         self.gmail = Gmail(email)
         self.email_book = _load_email_book()
+        # One connection for the watcher's lifetime: opening per query
+        # re-reads the schema and re-applies PRAGMAs every time. run.py
+        # drives ticks serially, so no lock is needed around it.
+        self.con = db()
+        # Gmail calls are network-bound; fan them out over the session's
+        # connection pool, throttled below the per-user quota. (An
+        # httpx.AsyncClient + asyncio rewrite would shave some thread
+        # overhead, but the batch endpoint already collapses most calls
+        # and run.py's drivers are synchronous; threads keep the worker
+        # dependency-free.)
+        self._pool = ThreadPoolExecutor(max_workers=16)
+        self._bucket = _TokenBucket(rate=200.0, burst=200.0)
+        # deal_id -> last successful subject-tag search; quiet deals only
+        # get re-searched every few minutes instead of every tick.
+        self._last_search: Dict[int, float] = {}
 
     def _active_deals(self) -> List[sqlite3.Row]:
-        con = db()
         # recent deals for this sender (last 45 days)
-        rows = con.execute("""
+        return self.con.execute("""
             SELECT id, subject, sender_email, created_at
               FROM deals
              WHERE sender_email = ?
@@ -222,41 +465,53 @@ class GmailWatcher:
              ORDER BY id DESC
              LIMIT 400
         """, (self.email,)).fetchall()
-        con.close()
-        return rows
 
     def _deliveries_for(self, deal_id: int) -> List[sqlite3.Row]:
-        con = db()
-        rows = con.execute("""
-            SELECT lender_name, provider, provider_msg_id, created_at
+        return self.con.execute("""
+            SELECT lender_name, provider, provider_msg_id, thread_id, created_at
               FROM deliveries
              WHERE deal_id = ?
              ORDER BY id ASC
         """, (deal_id,)).fetchall()
-        con.close()
-        return rows
 
-    def _insert_decision(self, deal_id: int, lender: str, status: str, reason: str,
-                         offer: dict, stips: dict, provider: str, message_id: str,
-                         thread_id: str, snippet: str):
-        con = db(); cur = con.cursor()
+    def _deliveries_by_deal(self, deal_ids: List[int]) -> Dict[int, List[sqlite3.Row]]:
+        """All deliveries for a set of deals in one statement, grouped by
+        deal_id — replaces up to 400 tiny per-deal queries in tick."""
+        if not deal_ids:
+            return {}
+        ph = ",".join("?" * len(deal_ids))
+        rows = self.con.execute(f"""
+            SELECT deal_id, lender_name, provider, provider_msg_id, thread_id, created_at
+              FROM deliveries
+             WHERE deal_id IN ({ph})
+             ORDER BY deal_id, id ASC
+        """, deal_ids).fetchall()
+        out: Dict[int, List[sqlite3.Row]] = {}
+        for r in rows:
+            out.setdefault(r["deal_id"], []).append(r)
+        return out
+
+    def _flush_decisions(self, rows: List[DecisionRow]) -> int:
+        """Write a tick's worth of decisions in one transaction (one fsync
+        instead of one per row). Returns the number actually inserted."""
+        if not rows:
+            return 0
+        # BEGIN IMMEDIATE grabs the write lock up front rather than on the
+        # first insert, so concurrent watchers queue instead of colliding.
+        self.con.execute("BEGIN IMMEDIATE")
         try:
-            cur.execute("""
-                INSERT OR IGNORE INTO decisions
-                (deal_id, lender, status, reason, offer_json, stips_json, provider, message_id, thread_id, snippet, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                deal_id, lender, status, reason, json.dumps(offer or {}), json.dumps(stips or {}),
-                provider, message_id, thread_id, snippet, int(time.time())
-            ))
-            con.commit()
-        finally:
-            con.close()
-
-    def _process_message(self, deal_id: int, lender_hint: str, msg_meta: dict):
-        hdrs = msg_meta.get("payload", {}).get("headers", [])
-        frm  = _extract_email(_parse_hdr(hdrs, "From"))
-        subj = _parse_hdr(hdrs, "Subject")
+            cur = self.con.executemany(_DECISION_INSERT_SQL, rows)
+            self.con.execute("COMMIT")
+        except Exception:
+            self.con.execute("ROLLBACK")
+            raise
+        return max(cur.rowcount, 0)
+
+    def _process_message(self, deal_id: int, lender_hint: str, msg_meta: dict) -> DecisionRow:
+        """Build the decisions insert row for one message (no DB write)."""
+        hmap = _headers_map(msg_meta.get("payload", {}).get("headers", []))
+        frm  = _extract_email(hmap.get("from", ""))
+        subj = hmap.get("subject", "")
         msg_id = msg_meta.get("id")
         thread_id = msg_meta.get("threadId")
         snippet = msg_meta.get("snippet") or ""
@@ -270,57 +525,115 @@ class GmailWatcher:
         offer  = _offer_hint(text)
         stips  = {}
 
-        self._insert_decision(
+        return DecisionRow(
             deal_id=deal_id, lender=lender, status=status, reason=reason,
-            offer=offer, stips=stips, provider="gmail",
-            message_id=msg_id, thread_id=thread_id, snippet=snippet
+            offer_json=_json_dumps(offer or {}), stips_json=_json_dumps(stips or {}),
+            provider="gmail", message_id=msg_id, thread_id=thread_id,
+            snippet=snippet, updated_at=int(time.time()),
         )
 
-    def tick(self):
+    def tick(self) -> int:
+        """One polling cycle. Returns how many new decisions were stored,
+        so the scheduler can poll busy accounts harder."""
+        # pick up emails.json edits (cheap: stat-only unless it changed)
+        self.email_book = _load_email_book()
         deals = self._active_deals()
         if not deals:
-            return
+            return 0
 
-        for d in deals:
-            deal_id = d["id"]
-            # Strategy 1: subject tag (#DealID)
+        rows: List[DecisionRow] = []
+
+        # Strategy 1: subject tag (#DealID). Searches fan out on the
+        # thread pool (network-bound), then every matching id is pulled
+        # in one batched round trip instead of one messages.get per id.
+        def _search_deal(deal_id: int) -> List[str]:
+            self._bucket.take(5)
+            q = f'subject:"#%s" newer_than:45d -from:%s' % (deal_id, self.email)
+            return self.gmail.search(q, max_results=20)
+
+        now = time.time()
+        due = [d["id"] for d in deals
+               if now - self._last_search.get(d["id"], 0.0) >= _SEARCH_COOLDOWN_SECS]
+        pending: List[Tuple[int, str]] = []
+        search_futs = {self._pool.submit(_search_deal, did): did for did in due}
+        for fut in as_completed(search_futs):
+            deal_id = search_futs[fut]
             try:
-                q = f'subject:"#%s" newer_than:45d -from:%s' % (deal_id, self.email)
-                for mid in self.gmail.search(q, max_results=20):
-                    meta = self.gmail.get_message(mid, fmt="metadata",
-                        headers=["Subject","From","To","Date","Message-Id","In-Reply-To","References"])
-                    self._process_message(deal_id, lender_hint="", msg_meta=meta)
+                for mid in fut.result():
+                    pending.append((deal_id, mid))
+                self._last_search[deal_id] = now  # failures retry next tick
             except Exception as e:
                 print(f"[{self.email}] search-subject #{deal_id} failed: {e}")
+        if pending:
+            try:
+                # _process_message only reads Subject/From; don't ship the rest
+                metas = dict(self.gmail.batch_get_messages(
+                    [mid for _, mid in pending], fmt="metadata",
+                    headers=["Subject","From"]))
+                for deal_id, mid in pending:
+                    meta = metas.get(mid)
+                    if meta:
+                        rows.append(self._process_message(deal_id, lender_hint="", msg_meta=meta))
+            except Exception as e:
+                print(f"[{self.email}] batch fetch failed: {e}")
 
-            # Strategy 2: follow the original sent thread for each delivery
-            for deliv in self._deliveries_for(deal_id):
+        # Strategy 2: follow the original sent thread for each delivery,
+        # one pool task per delivery
+        deliveries = self._deliveries_by_deal([d["id"] for d in deals])
+        follow_futs = {}
+        for d in deals:
+            deal_id = d["id"]
+            for deliv in deliveries.get(deal_id, []):
                 if (deliv["provider"] or "").lower() != "gmail":
                     continue
-                sent_id = deliv["provider_msg_id"] or ""
-                if not sent_id:
+                if not (deliv["provider_msg_id"] or ""):
                     continue
-                try:
-                    sent_meta = self.gmail.get_message(sent_id, fmt="metadata",
-                        headers=["Subject","From","To","Date","Message-Id"])
-                    thread_id = sent_meta.get("threadId")
-                    if not thread_id:
-                        continue
-                    thr = self.gmail.get_thread(thread_id)
-                    for m in thr.get("messages", []):
-                        # Only messages after we sent, and not from us
-                        hdrs = m.get("payload", {}).get("headers", [])
-                        frm  = _extract_email(_parse_hdr(hdrs, "From"))
-                        if frm == self.email:
-                            continue
-                        self._process_message(deal_id, lender_hint=deliv["lender_name"] or "", msg_meta=m)
-                except Exception as e:
-                    print(f"[{self.email}] thread follow for deal {deal_id} failed: {e}")
+                follow_futs[self._pool.submit(self._follow_delivery, deal_id, deliv)] = deal_id
+        for fut in as_completed(follow_futs):
+            deal_id = follow_futs[fut]
+            try:
+                rows.extend(fut.result())
+            except Exception as e:
+                print(f"[{self.email}] thread follow for deal {deal_id} failed: {e}")
+
+        return self._flush_decisions(rows)
+
+    def _follow_delivery(self, deal_id: int, deliv: sqlite3.Row) -> List[DecisionRow]:
+        """Fetch the sent message's thread and build decision rows for every
+        reply that isn't ours. Pure Gmail + CPU work, safe off-thread."""
+        rows: List[DecisionRow] = []
+        sent_id = deliv["provider_msg_id"] or ""
+        try:
+            stored_thread = deliv["thread_id"]
+        except (IndexError, KeyError):
+            stored_thread = None
+        # For Gmail sends the root message's id IS the thread id in nearly
+        # every case, so try the stored/guessed thread first and only fall
+        # back to the messages.get hop when that fetch fails.
+        guess = stored_thread or sent_id
+        try:
+            self._bucket.take(10)  # threads.get
+            thr = self.gmail.get_thread(guess)
+        except Exception:
+            self._bucket.take(15)  # messages.get (5) + threads.get (10)
+            # only threadId is consumed here; minimal skips the payload
+            sent_meta = self.gmail.get_message(sent_id, fmt="minimal")
+            thread_id = sent_meta.get("threadId")
+            if not thread_id:
+                return rows
+            thr = self.gmail.get_thread(thread_id)
+        for m in thr.get("messages", []):
+            # Only messages after we sent, and not from us
+            hmap = _headers_map(m.get("payload", {}).get("headers", []))
+            frm  = _extract_email(hmap.get("from", ""))
+            if frm == self.email:
+                continue
+            rows.append(self._process_message(deal_id, lender_hint=deliv["lender_name"] or "", msg_meta=m))
+        return rows
 
     def _count_decisions(self, deal_id: int) -> int:
-        con = db()
         try:
-            row = con.execute(
+            row = self.con.execute(
                 "SELECT COUNT(*) AS c FROM decisions WHERE deal_id=?",
                 (deal_id,)
             ).fetchone()
@@ -336,8 +649,6 @@ class GmailWatcher:
                     return int(row_as_dict(row).get("c", 0) or 0)
         except Exception:
             return 0
-        finally:
-            con.close()
    
 
 
@@ -350,19 +661,19 @@ class GmailWatcher:
           - Follow original sent thread(s) for each delivery
         Returns: {"processed": N, "added": M}
         """
-        before = self._count_decisions(deal_id)
         processed = 0
+        rows: List[DecisionRow] = []
 
-        # Strategy 1: Subject tag search
+        # Strategy 1: Subject tag search (batched metadata fetch)
         try:
             q = f'subject:"#%s" newer_than:365d -from:%s' % (deal_id, self.email)
-            for mid in self.gmail.search(q, max_results=50):
-                meta = self.gmail.get_message(
-                    mid,
-                    fmt="metadata",
-                    headers=["Subject","From","To","Date","Message-Id","In-Reply-To","References"]
-                )
-                self._process_message(deal_id, lender_hint="", msg_meta=meta)
+            mids = self.gmail.search(q, max_results=50)
+            for _mid, meta in self.gmail.batch_get_messages(
+                mids,
+                fmt="metadata",
+                headers=["Subject","From"]
+            ):
+                rows.append(self._process_message(deal_id, lender_hint="", msg_meta=meta))
                 processed += 1
         except Exception:
             pass
@@ -376,27 +687,25 @@ class GmailWatcher:
                 if not sent_id:
                     continue
 
-                sent_meta = self.gmail.get_message(
-                    sent_id,
-                    fmt="metadata",
-                    headers=["Subject","From","To","Date","Message-Id"]
-                )
+                sent_meta = self.gmail.get_message(sent_id, fmt="minimal")
                 thread_id = sent_meta.get("threadId")
                 if not thread_id:
                     continue
 
                 thr = self.gmail.get_thread(thread_id)
                 for m in thr.get("messages", []):
-                    hdrs = m.get("payload", {}).get("headers", [])
-                    frm  = _extract_email(_parse_hdr(hdrs, "From"))
+                    hmap = _headers_map(m.get("payload", {}).get("headers", []))
+                    frm  = _extract_email(hmap.get("from", ""))
                     if frm == self.email:  # skip our own messages
                         continue
-                    self._process_message(deal_id, lender_hint=(deliv["lender_name"] or ""), msg_meta=m)
+                    rows.append(self._process_message(deal_id, lender_hint=(deliv["lender_name"] or ""), msg_meta=m))
                     processed += 1
             except Exception:
                 # keep going per-delivery
                 continue
 
-        after = self._count_decisions(deal_id)
-        return {"processed": processed, "added": after - before}
+        # OR IGNORE means rowcount from the batched insert is exactly the
+        # number of new decisions; no before/after COUNT(*) scans needed.
+        added = self._flush_decisions(rows)
+        return {"processed": processed, "added": added}
 
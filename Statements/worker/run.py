@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import heapq
 import time, os
+import sqlite3
 from pathlib import Path
 from gmail_worker import GmailWatcher
 
@@ -26,13 +28,33 @@ if __name__ == "__main__":
     print(f"Starting watchers for: {', '.join(emails)}  (DB: {DB_PATH})")
     watchers = [GmailWatcher(email=e, db_path=str(DB_PATH)) for e in emails]
 
+    # Priority scheduler: pop the earliest-due watcher, tick it, and
+    # reschedule sooner when it found new decisions. Busy accounts stop
+    # waiting behind idle ones, and idle ones stop burning quota.
+    heap = [(time.time(), i, w) for i, w in enumerate(watchers)]
+    heapq.heapify(heap)
+    last_optimize = time.time()
     try:
         while True:
-            for w in watchers:
+            due, i, w = heapq.heappop(heap)
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            added = 0
+            try:
+                added = w.tick()  # one light polling cycle
+            except Exception as e:
+                print(f"[{w.email}] tick error: {e}")
+            delay = 15 if added else 120
+            heapq.heappush(heap, (time.time() + delay, i, w))
+            # let SQLite refresh its query-planner stats now and then
+            if time.time() - last_optimize >= 900:
                 try:
-                    w.tick()  # one light polling cycle
-                except Exception as e:
-                    print(f"[{w.email}] tick error: {e}")
-            time.sleep(60)  # tune as you like
+                    con = sqlite3.connect(str(DB_PATH))
+                    con.execute("PRAGMA optimize")
+                    con.close()
+                except Exception:
+                    pass
+                last_optimize = time.time()
     except KeyboardInterrupt:
         print("Exiting.")
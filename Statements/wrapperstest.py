@@ -1,22 +1,27 @@
 
+import io
 import os
+import mmap
+import time
 import uuid
+import string
 import hashlib
+import functools
 import base64
 import json
+import shutil
 import tempfile
 import subprocess
 from datetime import datetime, timezone
 from typing import Optional, Tuple, List
+from concurrent.futures import ThreadPoolExecutor
 
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.lib.utils import ImageReader
 
-from PyPDF2 import PdfReader, PdfWriter
-
-from pikepdf import Pdf, Name, Dictionary, Stream
+from pikepdf import Pdf, Name, Dictionary, Stream, ObjectStreamMode
 
 from supabase import create_client, Client
 
@@ -24,16 +29,82 @@ from supabase import create_client, Client
 # -------------------------------------------------------------------
 # Helpers: hashing, embedding, branding, cover (optional), fingerprint
 # -------------------------------------------------------------------
+@functools.lru_cache(maxsize=8)
+def _get_sb(url: str, key: str) -> Client:
+    # one client (and one TLS handshake) per credentials pair
+    return create_client(url, key)
+
+
+class _SafeNameTable(dict):
+    """Translation table for filename sanitizing: alnum passes through,
+    everything else becomes '_'. Missing entries are resolved once and
+    memoized, so translate() stays a C loop over dict hits."""
+    def __missing__(self, key):
+        v = key if chr(key).isalnum() else 95  # ord("_")
+        self[key] = v
+        return v
+
+
+_SAFE_NAME_TBL = _SafeNameTable(
+    {ord(c): ord(c) for c in string.ascii_letters + string.digits + "-_."}
+)
+
+
+# Branding rows change rarely; a 10-minute TTL skips the REST round
+# trip on back-to-back wraps for the same user
+_BRANDING_TTL = 600.0
+_BRANDING_CACHE = {}
+
+
+def _branding_cache_clear() -> None:
+    """Call after an admin updates user_branding."""
+    _BRANDING_CACHE.clear()
+# Hasher factory resolved once at import. CPython's hashlib already
+# dispatches to OpenSSL, which picks its SHA-NI/AVX2 kernels at runtime;
+# a faster binding can be slotted in here if one ever ships with the app.
+_HASHER = hashlib.sha256
+
+# 4 MiB chunks: SHA-NI chews through blocks so fast that the Python
+# call overhead per chunk becomes visible at 1 MiB
+_HASH_CHUNK = 4 * 1024 * 1024
+
+# Hashing releases the GIL inside OpenSSL, so it can run under the
+# overlay/compose work instead of in front of it
+_HASH_POOL = ThreadPoolExecutor(max_workers=2)
+
+
 def _sha256_file(path: str) -> str:
-    h = hashlib.sha256()
+    h = _HASHER()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        try:
+            # single C call over a zero-copy mapping; no per-chunk
+            # interpreter round trips or bytes allocations
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+            return h.hexdigest()
+        except (ValueError, OSError):
+            pass  # empty file, or map too large for this platform
+        f.seek(0)
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
             h.update(chunk)
     return h.hexdigest()
 
 
-def _embed_file(pdf: Pdf, file_bytes: bytes, filename: str, desc: str = ""):
-    fs_stream = pdf.make_indirect(Stream(pdf, file_bytes))
+def _embed_file(pdf: Pdf, file_bytes: Optional[bytes], filename: str, desc: str = "",
+                *, src_path: Optional[str] = None):
+    # With src_path the payload comes in as a read-only mmap, so large
+    # originals aren't duplicated on the heap just to be embedded
+    if file_bytes is None and src_path is not None:
+        with open(src_path, "rb") as f:
+            try:
+                file_bytes = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                file_bytes = f.read()
+    try:
+        fs_stream = pdf.make_indirect(Stream(pdf, file_bytes))
+    except TypeError:
+        file_bytes = bytes(file_bytes)
+        fs_stream = pdf.make_indirect(Stream(pdf, file_bytes))
     fs = pdf.make_indirect(Dictionary(
         Type=Name("/FileSpec"),   # FIX: leading slash
         F=filename,
@@ -59,6 +130,10 @@ def _resolve_user_branding(sb: Client, user_id: str) -> Tuple[str, Optional[str]
       2) /var/app/assets/logos/{user_id}.png
       3) ./static/logo.png
     """
+    ent = _BRANDING_CACHE.get(user_id)
+    if ent and ent[0] > time.time():
+        return ent[1]
+
     b = (
         sb.table("user_branding")
         .select("org_name,logo_path")
@@ -80,9 +155,49 @@ def _resolve_user_branding(sb: Client, user_id: str) -> Tuple[str, Optional[str]
         if os.path.exists(fallback):
             logo_path = fallback
 
+    _BRANDING_CACHE[user_id] = (time.time() + _BRANDING_TTL, (user_name, logo_path))
     return user_name, logo_path
 
 
+def _fetch_wrapper_context(sb: Client, deal_id: int, user_id: str) -> Tuple[str, str, Optional[str]]:
+    """
+    Returns (business_name, org_name, logo_path) in one round trip via
+    the get_wrapper_context(p_deal_id, p_user_id) Postgres function,
+    falling back to the discrete deals + user_branding selects when the
+    RPC isn't installed. The SQL lives with the database migrations.
+    """
+    try:
+        ctx = sb.rpc("get_wrapper_context", {
+            "p_deal_id": deal_id,
+            "p_user_id": user_id,
+        }).execute().data
+        if isinstance(ctx, list):
+            ctx = ctx[0] if ctx else None
+        if ctx:
+            business_name = (ctx.get("application_json") or {}).get("business_name") \
+                or ctx.get("business_name") or "Business"
+            user_name = ctx.get("org_name") or "Pathway Catalyst"
+            logo_path = ctx.get("logo_path") or None
+            if not logo_path:
+                candidate = f"/var/app/assets/logos/{user_id}.png"
+                if os.path.exists(candidate):
+                    logo_path = candidate
+            if not logo_path:
+                fallback = os.path.abspath(os.path.join("static", "logo.png"))
+                if os.path.exists(fallback):
+                    logo_path = fallback
+            return business_name, user_name, logo_path
+    except Exception:
+        pass
+
+    d = sb.table("deals").select("application_json").eq("id", deal_id).limit(1).execute().data
+    if not d:
+        raise ValueError(f"deal {deal_id} not found")
+    business_name = (d[0]["application_json"] or {}).get("business_name") or "Business"
+    user_name, logo_path = _resolve_user_branding(sb, user_id)
+    return business_name, user_name, logo_path
+
+
 def _make_cover(cover_path: str, *, logo_path: Optional[str], user_name: str,
                 user_tag: str, funder_name: str, deal_id: str,
                 business_name: str, recipient_email: str, tracking_id: str):
@@ -126,12 +241,16 @@ def _make_cover(cover_path: str, *, logo_path: Optional[str], user_name: str,
 
 def _apply_invisible_fingerprint(pdf: Pdf, *, fingerprint_id: str,
                                  recipient_email: str, deal_id: str, user_id: str):
+    # one timestamp for both the docinfo key and the payload — they
+    # should agree, and isoformat() isn't free
+    ts = datetime.now(timezone.utc).isoformat()
+
     info = pdf.docinfo or Dictionary()
     info[Name("/PCP_Fingerprint")] = fingerprint_id
     info[Name("/PCP_Recipient")] = recipient_email
     info[Name("/PCP_Deal")] = str(deal_id)
     info[Name("/PCP_UserId")] = str(user_id)
-    info[Name("/PCP_IssuedAt")] = datetime.now(timezone.utc).isoformat()
+    info[Name("/PCP_IssuedAt")] = ts
     pdf.docinfo = info
 
     payload = {
@@ -139,7 +258,7 @@ def _apply_invisible_fingerprint(pdf: Pdf, *, fingerprint_id: str,
         "r": recipient_email,
         "d": str(deal_id),
         "u": str(user_id),
-        "t": datetime.now(timezone.utc).isoformat(),
+        "t": ts,
     }
     raw = base64.b64encode(json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8"))
     _ = pdf.make_indirect(Stream(pdf, raw))  # inert payload object
@@ -149,18 +268,143 @@ def _apply_invisible_fingerprint(pdf: Pdf, *, fingerprint_id: str,
 # Overlay building & composition (wrap every page with logo)
 # ----------------------------------------------------------
 def _probe_page_sizes(input_pdf: str) -> List[Tuple[float, float]]:
-    r = PdfReader(input_pdf)
-    sizes = []
-    for p in r.pages:
-        mb = p.mediabox
-        w = float(mb.right) - float(mb.left)
-        h = float(mb.top) - float(mb.bottom)
-        sizes.append((w, h))
-    return sizes
+    # qpdf's C xref walker via pikepdf: O(pages) mediabox reads instead
+    # of PyPDF2 materializing every object in Python
+    with Pdf.open(input_pdf) as pdf:
+        return [
+            (float(p.mediabox[2]) - float(p.mediabox[0]),
+             float(p.mediabox[3]) - float(p.mediabox[1]))
+            for p in pdf.pages
+        ]
+
+
+# Largest pixel edge any page can use a logo at (0.9in @ ~300 dpi);
+# decoding beyond this just bloats every page's XObject
+_LOGO_MAX_PX = 300
+
+
+@functools.lru_cache(maxsize=64)
+def _load_logo(path: str, mtime: float):
+    """Decode the logo once, downscale to the largest usable size, and
+    re-encode a single optimized PNG — ReportLab then reuses one shared
+    XObject (deduplicated by ImageReader identity) across all pages.
+
+    Memoized on (path, mtime): branding logos change rarely, so repeat
+    wrap calls skip the PNG decode/re-encode entirely until the file on
+    disk is actually replaced.
+    """
+    from PIL import Image
+    im = Image.open(path)
+    im.thumbnail((_LOGO_MAX_PX, _LOGO_MAX_PX))
+    buf = io.BytesIO()
+    im.save(buf, "PNG", optimize=True)
+    buf.seek(0)
+    r = ImageReader(buf)
+    return r, r.getSize()
+
+
+def _prep_logo(path: str):
+    return _load_logo(path, os.path.getmtime(path))
+
+
+def _logo_image_xobject(pdf: Pdf, path: str):
+    """Build one shared /Image XObject for the logo (RGB + SMask for
+    alpha). Returns (xobject, width_px, height_px)."""
+    from PIL import Image
+    im = Image.open(path)
+    im.thumbnail((_LOGO_MAX_PX, _LOGO_MAX_PX))
+    iw, ih = im.size
+    smask = None
+    if im.mode in ("RGBA", "LA", "PA"):
+        alpha = im.convert("RGBA").getchannel("A").tobytes()
+        smask = pdf.make_indirect(Stream(
+            pdf, alpha,
+            Type=Name("/XObject"), Subtype=Name("/Image"),
+            Width=iw, Height=ih,
+            ColorSpace=Name("/DeviceGray"), BitsPerComponent=8,
+        ))
+    if im.mode != "RGB":
+        im = im.convert("RGB")
+    kwargs = dict(
+        Type=Name("/XObject"), Subtype=Name("/Image"),
+        Width=iw, Height=ih,
+        ColorSpace=Name("/DeviceRGB"), BitsPerComponent=8,
+    )
+    if smask is not None:
+        kwargs["SMask"] = smask
+    return pdf.make_indirect(Stream(pdf, im.tobytes(), **kwargs)), iw, ih
+
+
+def _escape_pdf_text(s: str) -> str:
+    """PDF string-literal body for a /WinAnsiEncoding font: cp1252
+    bytes with specials backslash-escaped and everything non-printable
+    or >0x7f as octal (covers the bullet in the default footer). Text
+    WinAnsi can't represent raises UnicodeEncodeError, which kicks the
+    overlay builder over to the ReportLab fallback."""
+    out = []
+    for b in s.encode("cp1252"):
+        if b in (0x28, 0x29, 0x5C):          # ( ) backslash
+            out.append("\\" + chr(b))
+        elif 0x20 <= b < 0x7F:
+            out.append(chr(b))
+        else:
+            out.append(f"\\{b:03o}")
+    return "".join(out)
+
+
+def _build_overlay_pikepdf(
+    page_sizes: List[Tuple[float, float]],
+    logo_path: Optional[str],
+    footer_text: Optional[str],
+    *,
+    LOGO_MAX_IN: float,
+    LOGO_MAX_PCT: float,
+    MARGIN_IN: float,
+) -> Pdf:
+    """
+    Emit the overlay by writing canned content streams straight through
+    pikepdf: one shared /Logo image XObject, one shared Helvetica font,
+    and a few bytes of geometry per page. Skips ReportLab's canvas
+    state machine entirely — per-page cost is an f-string.
+    """
+    pdf = Pdf.new()
+    font = pdf.make_indirect(Dictionary(
+        Type=Name("/Font"), Subtype=Name("/Type1"), BaseFont=Name("/Helvetica"),
+        Encoding=Name("/WinAnsiEncoding"),
+    ))
+    logo = None
+    iw = ih = 0
+    if logo_path and os.path.exists(logo_path):
+        logo, iw, ih = _logo_image_xobject(pdf, logo_path)
+
+    footer_op = ""
+    if footer_text:
+        footer_op = f"BT /F1 9 Tf 43.2 43.2 Td ({_escape_pdf_text(footer_text)}) Tj ET"
+
+    margin = MARGIN_IN * inch
+    for (w, h) in page_sizes:
+        ops = []
+        if logo is not None:
+            tw = min(LOGO_MAX_IN * inch, w * LOGO_MAX_PCT)
+            th = tw * (ih / iw) if iw else tw * 0.7
+            x = w - tw - margin
+            y = h - th - margin
+            ops.append(f"q {tw:.2f} 0 0 {th:.2f} {x:.2f} {y:.2f} cm /Logo Do Q")
+        if footer_op:
+            ops.append(footer_op)
+
+        page = pdf.add_blank_page(page_size=(w, h))
+        # ops are pure ASCII at this point (text already octal-escaped)
+        page.Contents = pdf.make_indirect(Stream(pdf, " ".join(ops).encode("ascii")))
+        res = Dictionary(Font=Dictionary(F1=font))
+        if logo is not None:
+            res.XObject = Dictionary(Logo=logo)
+        page.Resources = res
+    return pdf
 
 
 def _build_multi_page_overlay(
-    overlay_path: str,
+    overlay_path,
     page_sizes: List[Tuple[float, float]],
     logo_path: Optional[str],
     footer_text: Optional[str] = None,
@@ -172,20 +416,72 @@ def _build_multi_page_overlay(
     """
     Create a multi-page PDF overlay that draws a small logo in the top-right
     and optional footer text. Logo scales to page size with aspect preserved.
+    Tries the direct pikepdf writer first; ReportLab remains the fallback
+    for images PIL can't decode.
     """
+    try:
+        pdf = _build_overlay_pikepdf(
+            page_sizes, logo_path, footer_text,
+            LOGO_MAX_IN=LOGO_MAX_IN, LOGO_MAX_PCT=LOGO_MAX_PCT, MARGIN_IN=MARGIN_IN,
+        )
+        pdf.save(overlay_path)
+        pdf.close()
+        return
+    except Exception:
+        pass
+    _build_multi_page_overlay_reportlab(
+        overlay_path, page_sizes, logo_path, footer_text,
+        LOGO_MAX_IN=LOGO_MAX_IN, LOGO_MAX_PCT=LOGO_MAX_PCT, MARGIN_IN=MARGIN_IN,
+    )
+
+
+def _build_overlay_in_memory(
+    page_sizes: List[Tuple[float, float]],
+    logo_path: Optional[str],
+    footer_text: Optional[str],
+) -> Pdf:
+    """Overlay as an open Pdf without touching disk: the direct pikepdf
+    writer first, ReportLab into a BytesIO for images PIL can't decode
+    (Canvas accepts any file-like object as its destination)."""
+    try:
+        return _build_overlay_pikepdf(
+            page_sizes, logo_path, footer_text,
+            LOGO_MAX_IN=0.9, LOGO_MAX_PCT=0.12, MARGIN_IN=0.4,
+        )
+    except Exception:
+        buf = io.BytesIO()
+        _build_multi_page_overlay_reportlab(buf, page_sizes, logo_path, footer_text)
+        buf.seek(0)
+        return Pdf.open(buf)
+
+
+def _build_multi_page_overlay_reportlab(
+    overlay_path,
+    page_sizes: List[Tuple[float, float]],
+    logo_path: Optional[str],
+    footer_text: Optional[str] = None,
+    *,
+    LOGO_MAX_IN: float = 0.9,
+    LOGO_MAX_PCT: float = 0.12,
+    MARGIN_IN: float = 0.4,
+) -> None:
+    """ReportLab fallback for the overlay builder."""
     c = None
     img_reader = None
     img_w = img_h = None
     if logo_path and os.path.exists(logo_path):
         try:
-            img_reader = ImageReader(logo_path)
-            img_w, img_h = img_reader.getSize()  # pixels; ratio only matters
+            img_reader, (img_w, img_h) = _prep_logo(logo_path)
         except Exception:
-            img_reader = None
+            try:
+                img_reader = ImageReader(logo_path)
+                img_w, img_h = img_reader.getSize()  # pixels; ratio only matters
+            except Exception:
+                img_reader = None
 
     for (w, h) in page_sizes:
         if c is None:
-            c = canvas.Canvas(overlay_path, pagesize=(w, h))
+            c = canvas.Canvas(overlay_path, pagesize=(w, h), pageCompression=1)
         else:
             c.setPageSize((w, h))
 
@@ -232,37 +528,49 @@ def _build_multi_page_overlay(
 
 
 
+# Resolved once at import: when the binary is absent every wrapper would
+# otherwise pay a doomed fork/exec (and ENOENT) before discovering it.
+_QPDF_BIN = shutil.which("qpdf")
+
+
 def _overlay_with_qpdf(input_pdf: str, overlay_pdf: str, output_pdf: str) -> None:
     """
     Preferred path: qpdf overlays per-page content streams without rasterizing.
     """
-    cmd = ["qpdf", "--overlay", overlay_pdf, "--", input_pdf, output_pdf]
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # compression/linearization ride along in the same invocation —
+    # one parse, one write, no second qpdf pass
+    if not _QPDF_BIN:
+        raise RuntimeError("qpdf binary not found on PATH")
+    cmd = [_QPDF_BIN, "--overlay", overlay_pdf, "--",
+           "--object-streams=generate", "--compress-streams=y", "--linearize",
+           input_pdf, output_pdf]
+    # stdout goes to /dev/null — qpdf writes the PDF to disk itself and
+    # Python shouldn't hold pipe buffers for its chatter; stderr is only
+    # decoded on failure
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=False)
     if proc.returncode != 0:
         raise RuntimeError(f"qpdf overlay failed: {proc.stderr.decode('utf-8', 'ignore')}")
 
 
 def _overlay_fallback_python(input_pdf: str, overlay_pdf: str, output_pdf: str) -> None:
     """
-    Fallback when qpdf is not available. Uses PyPDF2.merge_page which keeps
-    vector content. This still preserves layout, though qpdf is more robust.
+    Fallback when the qpdf binary is not available. Uses pikepdf's
+    add_overlay — the same C content-stream composition qpdf --overlay
+    does internally, including resource-dictionary merging — instead of
+    PyPDF2's slow Python-level merge_page decode/re-encode.
     """
-    base = PdfReader(input_pdf)
-    over = PdfReader(overlay_pdf)
-    writer = PdfWriter()
+    with Pdf.open(input_pdf) as base, Pdf.open(overlay_pdf) as over:
+        n_over = len(over.pages)
+        multi = (n_over == len(base.pages))
+        over0 = over.pages[0] if n_over else None
 
-    multi = (len(over.pages) == len(base.pages))
-    over0 = over.pages[0] if len(over.pages) else None
+        for i, page in enumerate(base.pages):
+            if multi:
+                page.add_overlay(over.pages[i])
+            elif over0 is not None:
+                page.add_overlay(over0)
 
-    for i, page in enumerate(base.pages):
-        if multi:
-            page.merge_page(over.pages[i])
-        elif over0:
-            page.merge_page(over0)
-        writer.add_page(page)
-
-    with open(output_pdf, "wb") as f:
-        writer.write(f)
+        base.save(output_pdf)
 
 
 def _wrap_whole_pdf_with_logo_and_metadata(*,
@@ -273,29 +581,66 @@ def _wrap_whole_pdf_with_logo_and_metadata(*,
     funder_name: str,
     recipient_email: str,
     deal_id: str,
-    fingerprint_id: str
+    fingerprint_id: str,
+    logo_path: Optional[str] = None
 ) -> None:
     """
     Compose overlay (logo + footer) on EVERY page of the original,
     then apply invisible fingerprint and embed the ORIGINAL bytes.
+    The caller passes logo_path so branding isn't re-fetched here.
     """
     # 1) Build overlay matching page sizes
     sizes = _probe_page_sizes(original_pdf_path)
-    _, logo_path = _resolve_user_branding(sb, user_id)
     footer_text = f"For: {funder_name} • {recipient_email} • Track: {fingerprint_id}"
 
+    # 2) Primary path, entirely in memory: the overlay Pdf never hits
+    # disk, add_overlay composes it onto the base, and the SAME Pdf
+    # object takes the fingerprint and embedded original — no temp
+    # directory, no composed.pdf round trip between steps.
+    try:
+        over = _build_overlay_in_memory(sizes, logo_path, footer_text)
+        try:
+            with Pdf.open(original_pdf_path) as base:
+                n_over = len(over.pages)
+                multi = (n_over == len(base.pages))
+                over0 = over.pages[0] if n_over else None
+                for i, page in enumerate(base.pages):
+                    if multi:
+                        page.add_overlay(over.pages[i])
+                    elif over0 is not None:
+                        page.add_overlay(over0)
+
+                _apply_invisible_fingerprint(
+                    base,
+                    fingerprint_id=fingerprint_id,
+                    recipient_email=recipient_email,
+                    deal_id=str(deal_id),
+                    user_id=str(user_id),
+                )
+                _embed_file(base, None, os.path.basename(original_pdf_path),
+                            desc="Original (untouched)", src_path=original_pdf_path)
+                base.save(
+                    out_path,
+                    linearize=True,
+                    object_stream_mode=ObjectStreamMode.generate,
+                    compress_streams=True,
+                )
+            return
+        finally:
+            over.close()
+    except Exception:
+        # no point building temp files for a fallback that can't run
+        if not _QPDF_BIN:
+            raise
+
+    # 3) qpdf fallback — the binary can't reliably take the overlay on
+    # stdin, so this branch keeps its temp files.
     with tempfile.TemporaryDirectory() as td:
         overlay_path = os.path.join(td, "overlay.pdf")
         _build_multi_page_overlay(overlay_path, sizes, logo_path, footer_text)
-
-        # 2) Compose with qpdf; fallback to PyPDF2 if needed
         composed_path = os.path.join(td, "composed.pdf")
-        try:
-            _overlay_with_qpdf(original_pdf_path, overlay_path, composed_path)
-        except Exception:
-            _overlay_fallback_python(original_pdf_path, overlay_path, composed_path)
+        _overlay_with_qpdf(original_pdf_path, overlay_path, composed_path)
 
-        # 3) Fingerprint & embed original into the composed wrapper
         pdf = Pdf.open(composed_path)
         _apply_invisible_fingerprint(
             pdf,
@@ -304,9 +649,15 @@ def _wrap_whole_pdf_with_logo_and_metadata(*,
             deal_id=str(deal_id),
             user_id=str(user_id),
         )
-        with open(original_pdf_path, "rb") as f:
-            _embed_file(pdf, f.read(), os.path.basename(original_pdf_path), desc="Original (untouched)")
-        pdf.save(out_path)
+        _embed_file(pdf, None, os.path.basename(original_pdf_path),
+                    desc="Original (untouched)", src_path=original_pdf_path)
+        # final serialization is the linearized one; no post-pass needed
+        pdf.save(
+            out_path,
+            linearize=True,
+            object_stream_mode=ObjectStreamMode.generate,
+            compress_streams=True,
+        )
 
 
 # ----------------------------------------------------------
@@ -330,23 +681,31 @@ def issue_wrapper_user_branded(*,
     - inserts a row in doc_tracking (trigger fills business_name/message_id)
     """
     os.makedirs(storage_dir, exist_ok=True)
-    sb: Client = create_client(supabase_url, supabase_service_key)
-
-    # Business name for filename/UI
-    d = sb.table("deals").select("application_json").eq("id", deal_id).limit(1).execute().data
-    if not d:
-        raise ValueError(f"deal {deal_id} not found")
-    business_name = (d[0]["application_json"] or {}).get("business_name") or "Business"
+    sb: Client = _get_sb(supabase_url, supabase_service_key)
 
-    user_name, _logo_path = _resolve_user_branding(sb, user_id)
+    # Deal + branding in one round trip where the RPC exists
+    business_name, user_name, _logo_path = _fetch_wrapper_context(sb, deal_id, user_id)
     user_tag = f"UID-{user_id[:8]}"
 
     tracking_id = str(uuid.uuid4())
-    sha256_hex = _sha256_file(original_pdf_path)
-    fingerprint_id = hashlib.sha256(f"{tracking_id}:{recipient_email}:{deal_id}:{user_id}".encode()).hexdigest()[:16]
+    # hash in the background; the digest isn't needed until the
+    # tracking row after the wrap completes
+    f_hash = _HASH_POOL.submit(_sha256_file, original_pdf_path)
+    # blake2b with an 8-byte digest gives the same 16-hex-char id as the
+    # old truncated sha256, minus the f-string round trip and the unused
+    # half of the digest. It's an identifier, not a MAC.
+    fingerprint_id = hashlib.blake2b(
+        b":".join([
+            tracking_id.encode(),
+            recipient_email.encode(),
+            str(deal_id).encode(),
+            user_id.encode(),
+        ]),
+        digest_size=8,
+    ).hexdigest()
 
     # Output naming
-    safe_biz = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in business_name)
+    safe_biz = business_name.translate(_SAFE_NAME_TBL)
     out_name = f"{deal_id}_{safe_biz}_{fingerprint_id}.wrapper.pdf"
     out_path = os.path.join(storage_dir, out_name)
 
@@ -360,18 +719,10 @@ def issue_wrapper_user_branded(*,
         recipient_email=recipient_email,
         deal_id=str(deal_id),
         fingerprint_id=fingerprint_id,
+        logo_path=_logo_path,
     )
 
-    # Optional post-optimize using qpdf (compress + linearize) if available
-    try:
-        linearized = os.path.join(storage_dir, f"{deal_id}_{safe_biz}_{fingerprint_id}.linear.pdf")
-        cmd = ["qpdf", "--object-streams=generate", "--compress-streams=y", "--linearize", out_path, linearized]
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if proc.returncode == 0 and os.path.exists(linearized):
-            # replace original with linearized
-            os.replace(linearized, out_path)
-    except Exception:
-        pass
+    sha256_hex = f_hash.result()
 
     # Insert tracking row (mirrors filled by trigger)
     row = {
@@ -397,3 +748,52 @@ def issue_wrapper_user_branded(*,
         "logo_path": _logo_path,
         "supabase_row": getattr(resp, "data", None)
     }
+
+
+def issue_wrappers_bulk(*,
+    user_id: str,
+    deal_ids: List[int],
+    original_pdf_path: str,
+    funder_name: str,
+    recipient_email: str,
+    storage_dir: str,
+    supabase_url: str,
+    supabase_service_key: str
+) -> List[dict]:
+    """
+    Issue wrappers for a batch of deals in one call. Shared work is paid
+    once up front — the client, the branding row, and the decoded logo
+    are warmed into their caches before the fan-out — and the per-deal
+    wraps (PDF composition, mostly C code that releases the GIL) run on
+    a thread pool. Results come back in deal_ids order.
+    """
+    os.makedirs(storage_dir, exist_ok=True)
+    sb: Client = _get_sb(supabase_url, supabase_service_key)
+
+    # Warm the shared caches once so the pool threads don't race cold
+    # lookups: branding TTL cache, and the mtime-keyed logo decode.
+    try:
+        _, logo_path = _resolve_user_branding(sb, user_id)
+        if logo_path and os.path.exists(logo_path):
+            _prep_logo(logo_path)
+    except Exception:
+        pass
+
+    def _do_one(deal_id: int) -> dict:
+        return issue_wrapper_user_branded(
+            user_id=user_id,
+            deal_id=deal_id,
+            original_pdf_path=original_pdf_path,
+            funder_name=funder_name,
+            recipient_email=recipient_email,
+            storage_dir=storage_dir,
+            supabase_url=supabase_url,
+            supabase_service_key=supabase_service_key,
+        )
+
+    if len(deal_ids) <= 1:
+        return [_do_one(d) for d in deal_ids]
+
+    workers = min(len(deal_ids), os.cpu_count() or 4)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_do_one, deal_ids))